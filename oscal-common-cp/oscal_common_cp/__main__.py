@@ -1,8 +1,14 @@
 from pathlib import Path
 import argparse
-from typing import Any
+import json
+import sys
 
+from .batch import ConversionOptions, convert_batch, find_policy_files
+from .cache import ConversionCache, default_cache_dir
+from .catalog_writer import SERIALIZERS, stream_catalog_json
+from .profiling import profile_conversion, profile_report_paths
 from .simple_oscal_parser import SimpleOscalParser
+from .stats import ConversionStats
 
 
 if __name__ == "__main__":
@@ -19,41 +25,225 @@ if __name__ == "__main__":
         help="Type of parser to use (default: simple)",
         default="simple",
     )
-    arg_parser.add_argument("filename", help="The filename of the policy to parse.")
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        help="Number of worker processes to use when converting several files (default: one per CPU)",
+        default=None,
+    )
+    arg_parser.add_argument(
+        "--deterministic-uuids",
+        dest="deterministic_uuids",
+        action="store_true",
+        help="Derive UUIDs from titles, versions and URLs so unchanged input gives identical output",
+    )
+    arg_parser.add_argument(
+        "--serializer",
+        dest="serializer",
+        choices=SERIALIZERS,
+        help="JSON serializer to use. auto uses orjson for --compact output when it is "
+        "installed, and pydantic otherwise (default: auto)",
+        default="auto",
+    )
+    arg_parser.add_argument(
+        "--compact",
+        dest="pretty",
+        action="store_false",
+        help="Write the catalog without indentation",
+    )
+    arg_parser.add_argument(
+        "--stream",
+        dest="streaming",
+        action="store_true",
+        help="Write each top-level group as soon as it is converted, rather than building the whole catalog first",
+    )
+    arg_parser.add_argument(
+        "--stdout",
+        dest="stdout",
+        action="store_true",
+        help="Stream the catalog to stdout instead of writing it to oscal-json (single file only)",
+    )
+    arg_parser.add_argument(
+        "--binary",
+        dest="binary",
+        action="store_true",
+        help="Also write each catalog in the memory-mappable binary format, as .oscalb next to the JSON",
+    )
+    arg_parser.add_argument(
+        "--trusted",
+        dest="trusted",
+        action="store_true",
+        help="Build groups, controls and parts without pydantic validation (faster, same output)",
+    )
+    arg_parser.add_argument(
+        "--validate",
+        dest="validate",
+        action="store_true",
+        help="Validate the finished catalog in a single pass, e.g. after a --trusted conversion",
+    )
+    arg_parser.add_argument(
+        "--stats",
+        dest="stats",
+        action="store_true",
+        help="Print stage timings and object counts for each file as JSON instead of the batch report",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        dest="profile",
+        type=Path,
+        help="Convert a single file under cProfile and tracemalloc, writing the pstats data to this path "
+        "and text reports next to it (the path with .txt and .allocations.txt appended). Skips the cache.",
+        default=None,
+    )
+    arg_parser.add_argument(
+        "--profile-top",
+        dest="profile_top",
+        type=int,
+        help="Number of functions and allocation sites in the --profile reports (default: 25)",
+        default=25,
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="Always convert, ignoring and not updating the conversion cache",
+    )
+    arg_parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        type=Path,
+        help="Directory for cached conversions (default: ~/.cache/oscal-common-cp)",
+        default=None,
+    )
+    arg_parser.add_argument(
+        "--cache-size",
+        dest="cache_size",
+        type=int,
+        help="Maximum size of the conversion cache in MB (default: 256)",
+        default=256,
+    )
+    arg_parser.add_argument(
+        "filename",
+        help="The filename of the policy to parse, or a directory or glob of policies to convert in a batch.",
+    )
 
     args = arg_parser.parse_args()
 
-    parser_dict: dict[str, Any] = {}
+    policy_paths = find_policy_files(args.filename)
+    # Anything other than a single file is a batch, and gets a report
+    batch_mode = not Path(args.filename).is_file()
 
-    parser_dict["simple"] = SimpleOscalParser()
+    if len(policy_paths) == 0:
+        print("You provided an argument that does not exist or is not a file.")
+        arg_parser.print_help()
+        exit(1)
 
-    # oscal_parser = parser_dict[args.parser_type]
-    oscal_parser = SimpleOscalParser()
+    if args.validate and (args.streaming or args.stdout):
+        print("--validate needs the whole catalog, so it can't be combined with --stream or --stdout.")
+        exit(1)
 
-    common_file_path = Path(args.filename)
+    if args.profile is not None:
+        if batch_mode or args.stdout or args.streaming:
+            print("--profile can only be used with a single file, without --stdout or --stream.")
+            exit(1)
+        output_path = profile_conversion(
+            input_path=policy_paths[0],
+            output_dir=Path.joinpath(Path.cwd(), "oscal-json"),
+            options=ConversionOptions(
+                parser_type=args.parser_type,
+                deterministic_uuids=args.deterministic_uuids,
+                serializer=args.serializer,
+                pretty=args.pretty,
+                trusted=args.trusted,
+                validate=args.validate,
+            ),
+            profile_path=args.profile,
+            top=args.profile_top,
+        )
+        print(f"Wrote {output_path}")
+        summary_path, allocations_path = profile_report_paths(args.profile)
+        print(f"Profile in {args.profile}, reports in {summary_path} and {allocations_path}")
+        exit(0)
 
-    if common_file_path.exists() and common_file_path.is_file():
-        with open(common_file_path) as common_file:
-            common_catalog = oscal_parser.common_policy_to_catalog(
-                common_file.read().splitlines()
+    if args.stdout:
+        if batch_mode:
+            print("--stdout can only be used with a single file.", file=sys.stderr)
+            exit(1)
+        if args.binary:
+            print("--binary writes a file next to the JSON, so it can't be combined with --stdout.", file=sys.stderr)
+            exit(1)
+        # Memoized sections would stay in memory after they are written, so skip the memo
+        oscal_parser = SimpleOscalParser(memoize_sections=False)
+        stats = ConversionStats() if args.stats else None
+        with open(policy_paths[0]) as common_file:
+            stream_catalog_json(
+                oscal_parser.stream_catalog(
+                    common_file, args.deterministic_uuids, args.trusted, stats
+                ),
+                sys.stdout,
+                args.serializer,
+                args.pretty,
             )
-    else:
-        print("You provided an argument that does not exist or is not a file.")
-        arg_parser.print_help
-        exit(1)
+        if stats is not None:
+            # stdout has the catalog on it
+            print(json.dumps({str(policy_paths[0]): stats.to_dict()}, indent=4), file=sys.stderr)
+        exit(0)
 
-    if common_catalog.catalog is not None:
-        # Write the catalog to stdout
-        title = common_catalog.catalog.metadata.title
-        version = common_catalog.catalog.metadata.version
-        oscal_version = common_catalog.catalog.metadata.oscal_version
-        output_filename = (
-            f"{title}-{version}-oscal-{oscal_version}-{args.parser_type}.json"
+    cache = None
+    if args.use_cache:
+        cache = ConversionCache(
+            cache_dir=args.cache_dir if args.cache_dir is not None else default_cache_dir(),
+            max_bytes=args.cache_size * 1024 * 1024,
         )
-        with open(
-            file=Path.joinpath(Path.cwd(), "oscal-json", output_filename), mode="w"
-        ) as catalog_file:
-            catalog_file.write(common_catalog.model_dump_json())
-    else:
-        print("Could not parse catalog")
+
+    results = convert_batch(
+        input_paths=policy_paths,
+        output_dir=Path.joinpath(Path.cwd(), "oscal-json"),
+        options=ConversionOptions(
+            parser_type=args.parser_type,
+            deterministic_uuids=args.deterministic_uuids,
+            serializer=args.serializer,
+            pretty=args.pretty,
+            streaming=args.streaming,
+            trusted=args.trusted,
+            validate=args.validate,
+            collect_stats=args.stats,
+            binary=args.binary,
+        ),
+        workers=args.jobs,
+        cache=cache,
+    )
+
+    if args.stats:
+        # One entry per file, cached files have no stats since they weren't converted
+        print(
+            json.dumps(
+                {
+                    str(result.input_path): {
+                        "total_seconds": result.seconds,
+                        "cached": result.cached,
+                        "error": result.error,
+                        **(result.stats or {}),
+                    }
+                    for result in results
+                },
+                indent=4,
+            )
+        )
+    elif batch_mode:
+        for result in results:
+            if result.cached:
+                print(f"cached {result.seconds:8.2f}s  {result.input_path} -> {result.output_path}")
+            elif result.succeeded:
+                print(f"ok     {result.seconds:8.2f}s  {result.input_path} -> {result.output_path}")
+            else:
+                print(f"FAILED {result.seconds:8.2f}s  {result.input_path}: {result.error}")
+        failures = len([result for result in results if not result.succeeded])
+        print(f"Converted {len(results) - failures} of {len(results)} files, {failures} failed.")
+    elif not results[0].succeeded:
+        print(f"Could not parse catalog: {results[0].error}")
+
+    if not all(result.succeeded for result in results):
         exit(1)
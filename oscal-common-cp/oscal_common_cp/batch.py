@@ -0,0 +1,278 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from pathlib import Path
+from typing import Any
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from .binary_catalog import binary_catalog_path, write_binary_catalog
+from .cache import ConversionCache
+from .catalog_writer import (
+    catalog_filename,
+    catalog_output_path,
+    metadata_filename,
+    resolve_serializer,
+    serialize_catalog,
+    write_catalog_json,
+    write_catalog_stream,
+)
+from .oscal_models import import_models
+from .simple_oscal_parser import SimpleOscalParser, validate_catalog
+from .stats import ConversionStats
+
+
+class ConversionResult:
+    # The outcome of converting one tokenized policy file
+    def __init__(
+        self,
+        input_path: Path,
+        seconds: float,
+        output_path: Path | None = None,
+        error: str | None = None,
+        cached: bool = False,
+        stats: dict[str, Any] | None = None,
+    ) -> None:
+        self.input_path = input_path
+        self.seconds = seconds
+        self.output_path = output_path
+        self.error = error
+        self.cached = cached
+        # ConversionStats.to_dict(), when stats were collected
+        self.stats = stats
+
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+def find_policy_files(pattern: str) -> list[Path]:
+    # The argument can be a single file, a directory of tokenized markdown, or a glob
+    pattern_path = Path(pattern)
+    if pattern_path.is_file():
+        return [pattern_path]
+    elif pattern_path.is_dir():
+        return sorted(pattern_path.glob("*.md"))
+    else:
+        return sorted(Path(match) for match in glob.glob(pattern) if Path(match).is_file())
+
+
+class ConversionOptions:
+    # Settings for a batch that change the generated output. Passed to each worker process.
+    def __init__(
+        self,
+        parser_type: str = "simple",
+        deterministic_uuids: bool = False,
+        serializer: str = "auto",
+        pretty: bool = True,
+        streaming: bool = False,
+        trusted: bool = False,
+        validate: bool = False,
+        collect_stats: bool = False,
+        binary: bool = False,
+    ) -> None:
+        self.parser_type = parser_type
+        self.deterministic_uuids = deterministic_uuids
+        self.serializer = serializer
+        self.pretty = pretty
+        # Write each top-level group as soon as it is built. The output is the same.
+        self.streaming = streaming
+        # Build the catalog without per-object validation, optionally validating it once at
+        # the end. Neither changes the output, so they are not part of the cache key.
+        self.trusted = trusted
+        self.validate = validate
+        # Record stage timings and object counts for each file
+        self.collect_stats = collect_stats
+        # Also write the catalog in the binary format, next to the JSON. Built from the
+        # JSON, so it isn't part of the cache key either.
+        self.binary = binary
+
+
+    def cache_key_parts(self) -> list[str]:
+        # Every option that changes the bytes we write has to be part of the cache key
+        return [
+            self.parser_type,
+            f"deterministic_uuids={self.deterministic_uuids}",
+            # What "auto" resolves to can depend on whether orjson is installed
+            f"serializer={resolve_serializer(self.serializer, self.pretty)}",
+            f"pretty={self.pretty}",
+        ]
+
+
+# Each worker process builds its parsers once and reuses them for every file it is given.
+# Streamed conversions get a parser without the section memo, since the memo would keep
+# every group alive after it has been written, which is what streaming is meant to avoid.
+_parser: SimpleOscalParser | None = None
+_streaming_parser: SimpleOscalParser | None = None
+
+
+def convert_file(
+    input_path: Path,
+    output_dir: Path,
+    options: ConversionOptions,
+    cache: ConversionCache | None = None,
+) -> ConversionResult:
+    global _parser, _streaming_parser
+
+    stats = None
+    if options.collect_stats:
+        stats = ConversionStats()
+        import_models()
+    start_time = time.perf_counter()
+    try:
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.key_for_file(input_path, *options.cache_key_parts())
+            cached_catalog = cache.get(cache_key)
+            if cached_catalog is not None:
+                # Unchanged input - reuse the stored catalog and skip the parse entirely
+                catalog_name, catalog_json = cached_catalog
+                output_path = write_catalog_json(
+                    catalog_json, catalog_output_path(output_dir, catalog_name)
+                )
+                if options.binary:
+                    write_binary_catalog(json.loads(catalog_json), binary_catalog_path(output_path))
+                return ConversionResult(
+                    input_path=input_path,
+                    seconds=time.perf_counter() - start_time,
+                    output_path=output_path,
+                    cached=True,
+                )
+
+        with open(input_path) as common_file:
+            if options.streaming:
+                if _streaming_parser is None:
+                    _streaming_parser = SimpleOscalParser(memoize_sections=False)
+                catalog_stream = _streaming_parser.stream_catalog(
+                    common_file,
+                    deterministic_uuids=options.deterministic_uuids,
+                    trusted=options.trusted,
+                    stats=stats,
+                )
+                catalog_name = metadata_filename(catalog_stream.metadata, options.parser_type)
+                # Groups are built while they are written, so this includes building them
+                with stats_timer(stats, "write"):
+                    output_path = write_catalog_stream(
+                        catalog_stream,
+                        catalog_output_path(output_dir, catalog_name),
+                        options.serializer,
+                        options.pretty,
+                    )
+                catalog_json = None
+            else:
+                if _parser is None:
+                    _parser = SimpleOscalParser()
+                common_catalog = _parser.common_policy_to_catalog(
+                    common_file,
+                    deterministic_uuids=options.deterministic_uuids,
+                    trusted=options.trusted,
+                    stats=stats,
+                )
+                if options.validate:
+                    with stats_timer(stats, "validate"):
+                        validate_catalog(common_catalog)
+                catalog_name = catalog_filename(common_catalog, options.parser_type)
+                with stats_timer(stats, "serialize"):
+                    catalog_json = serialize_catalog(
+                        common_catalog, options.serializer, options.pretty
+                    )
+                with stats_timer(stats, "write"):
+                    output_path = write_catalog_json(
+                        catalog_json, catalog_output_path(output_dir, catalog_name)
+                    )
+
+        if catalog_json is None and (options.binary or cache is not None):
+            # Streamed straight to disk, so read it back
+            catalog_json = output_path.read_text()
+        if options.binary and catalog_json is not None:
+            with stats_timer(stats, "write_binary"):
+                write_binary_catalog(json.loads(catalog_json), binary_catalog_path(output_path))
+        if cache is not None and cache_key is not None and catalog_json is not None:
+            cache.put(cache_key, catalog_name, catalog_json)
+    except Exception as e:
+        # Report the failure rather than raising, so one bad file doesn't stop a batch.
+        # Exceptions also don't always survive the trip back from a worker process.
+        return ConversionResult(
+            input_path=input_path,
+            seconds=time.perf_counter() - start_time,
+            error=f"{type(e).__name__}: {e}",
+        )
+
+    return ConversionResult(
+        input_path=input_path,
+        seconds=time.perf_counter() - start_time,
+        output_path=output_path,
+        stats=stats.to_dict() if stats is not None else None,
+    )
+
+
+def stats_timer(stats: ConversionStats | None, stage: str) -> AbstractContextManager[None]:
+    if stats is None:
+        return nullcontext()
+    return stats.timer(stage)
+
+
+def convert_batch(
+    input_paths: list[Path],
+    output_dir: Path,
+    options: ConversionOptions,
+    workers: int | None = None,
+    cache: ConversionCache | None = None,
+) -> list[ConversionResult]:
+    # Convert every file across a pool of worker processes. Results are returned in the
+    # same order as input_paths.
+    if len(input_paths) == 1:
+        return [convert_file(input_paths[0], output_dir, options, cache)]
+
+    # Output names come from the version in each policy, so two inputs can claim the same
+    # one. Each file is converted into a staging directory of its own and only moved into
+    # output_dir once the batch is done, so neither can overwrite the other.
+    output_dir.mkdir(parents=True, exist_ok=True)
+    staging_dir = Path(tempfile.mkdtemp(prefix=".batch-", dir=output_dir))
+    try:
+        staging_dirs = [
+            Path.joinpath(staging_dir, str(index)) for index in range(len(input_paths))
+        ]
+        if workers == 1:
+            # Not worth starting a pool
+            results = [
+                convert_file(input_path, file_staging_dir, options, cache)
+                for input_path, file_staging_dir in zip(input_paths, staging_dirs)
+            ]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(convert_file, input_path, file_staging_dir, options, cache)
+                    for input_path, file_staging_dir in zip(input_paths, staging_dirs)
+                ]
+                results = [future.result() for future in futures]
+        publish_results(results, output_dir)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return results
+
+
+def publish_results(results: list[ConversionResult], output_dir: Path) -> None:
+    # Move staged catalogs into output_dir in input order. The first file to produce a name
+    # keeps it; later files with the same name fail rather than replace it.
+    published: dict[str, Path] = {}
+    for result in results:
+        if not result.succeeded or result.output_path is None:
+            continue
+        catalog_name = result.output_path.name
+        if catalog_name in published:
+            result.error = (
+                f"Its catalog {catalog_name} was already written by {published[catalog_name]} "
+                "in this batch"
+            )
+            result.output_path = None
+            continue
+        published[catalog_name] = result.input_path
+        for staged_path in (result.output_path, binary_catalog_path(result.output_path)):
+            if staged_path.exists():
+                os.replace(staged_path, Path.joinpath(output_dir, staged_path.name))
+        result.output_path = catalog_output_path(output_dir, catalog_name)
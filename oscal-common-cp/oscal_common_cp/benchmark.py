@@ -0,0 +1,451 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from .catalog_writer import find_catalogs, serialize_catalog
+from .context import ConversionContext
+from .oscal_models import catalog, document, import_models
+from .simple_oscal_parser import PARSER_VERSION, SimpleOscalParser
+from .synthetic_policy import SyntheticPolicy
+
+try:
+    # Peak RSS comes from getrusage, which is only available on Unix
+    import resource
+except ImportError:
+    resource = None
+
+# Stages of a conversion, in the order they run. scan_sections and build_groups are the two
+# halves of section_to_group; parse_html_table and parse_backmatter are also timed on their
+# own, although their time is already included in the stages that call them.
+STAGES = [
+    "split_sections",
+    "parse_metadata",
+    "scan_sections",
+    "build_groups",
+    "parse_html_table",
+    "parse_backmatter",
+    "serialize",
+]
+
+
+def scale_policy(policy_lines: Iterable[str], scale: int) -> list[str]:
+    # Make a larger policy out of a real one by repeating its body. The introduction and the
+    # references are kept once, so the result still converts like a real document.
+    parser = SimpleOscalParser(memoize_sections=False)
+    sections = list(parser.split_sections(policy_lines))
+
+    body_sections: list[list[str]] = []
+    reference_sections: list[list[str]] = []
+    for section in sections[1:]:
+        if "References" in section[0] or "Bibliography" in section[0]:
+            reference_sections.append(section)
+        else:
+            body_sections.append(section)
+
+    scaled_sections = sections[:1] + body_sections * scale + reference_sections
+    # split_sections never yields the lines after the last header, so add an empty one to
+    # keep the last real section in the scaled policy
+    scaled_sections.append(["# "])
+    return [line + "\n" for section in scaled_sections for line in section]
+
+
+def count_catalog_objects(groups: Iterable[catalog.Group]) -> dict[str, int]:
+    counts = {"groups": 0, "controls": 0, "parts": 0}
+    for group in groups:
+        counts["groups"] += 1
+        for control in group.controls or []:
+            counts["controls"] += 1
+            counts["parts"] += len(control.parts or [])
+        child_counts = count_catalog_objects(group.groups or [])
+        for name in counts:
+            counts[name] += child_counts[name]
+    return counts
+
+
+def peak_rss_bytes() -> int | None:
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def timed(stages: dict[str, float], stage: str, run_stage: Callable[[], Any]) -> Any:
+    start_time = time.perf_counter()
+    result = run_stage()
+    stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start_time
+    return result
+
+
+def time_conversion(policy_lines: list[str]) -> tuple[dict[str, float], dict[str, int]]:
+    # Run each stage of common_policy_to_catalog by hand so each one can be timed
+    parser = SimpleOscalParser(memoize_sections=False)
+    stages: dict[str, float] = {}
+
+    sections = timed(stages, "split_sections", lambda: list(parser.split_sections(policy_lines)))
+    context = ConversionContext()
+    metadata = timed(stages, "parse_metadata", lambda: parser.parse_metadata(sections[0], context))
+    section_records = timed(
+        stages, "scan_sections", lambda: list(parser.scan_sections(iter(sections[1:]), context))
+    )
+    groups = timed(
+        stages, "build_groups", lambda: list(parser.sections_to_groups(section_records, context))
+    )
+
+    # Tables and references again on their own, with a context of their own
+    table_context = ConversionContext()
+    table_count = 0
+    stages["parse_html_table"] = 0.0
+    stages["parse_backmatter"] = 0.0
+    for section in sections:
+        for table_start, table_end in parser.locate_html_tables(section):
+            timed(
+                stages,
+                "parse_html_table",
+                lambda: parser.parse_html_table(section, table_start, table_end, table_context),
+            )
+            table_count += 1
+        if "References" in section[0] or "Bibliography" in section[0]:
+            timed(
+                stages,
+                "parse_backmatter",
+                lambda: parser.parse_backmatter(section[1:], table_context),
+            )
+
+    back_matter = context.backmatter
+    if back_matter is None:
+        back_matter = parser.parse_backmatter([], context)
+    common_catalog = document.Document(
+        catalog=catalog.Catalog(
+            uuid=context.make_uuid("catalog"),
+            metadata=metadata,
+            groups=groups,
+            back_matter=back_matter,
+        )
+    )
+    timed(stages, "serialize", lambda: serialize_catalog(common_catalog))
+
+    counts = count_catalog_objects(groups)
+    counts["lines"] = len(policy_lines)
+    counts["sections"] = len(sections)
+    counts["tables"] = table_count
+    counts["resources"] = len(back_matter.resources or [])
+    return stages, counts
+
+
+def benchmark_policy(name: str, policy_path: Path, scale: int, repeat: int) -> dict[str, Any]:
+    with open(policy_path) as policy_file:
+        policy_lines = policy_file.readlines()
+    if scale > 1:
+        policy_lines = scale_policy(policy_lines, scale)
+    return benchmark_lines(name, str(policy_path), scale, policy_lines, repeat)
+
+
+def benchmark_synthetic(name: str, sections: int, repeat: int) -> dict[str, Any]:
+    # A generated policy with the default SyntheticPolicy settings
+    policy_lines = [line + "\n" for line in SyntheticPolicy(sections=sections).lines()]
+    return benchmark_lines(name, f"synthetic:{sections}", 1, policy_lines, repeat)
+
+
+def benchmark_lines(
+    name: str, input_name: str, scale: int, policy_lines: list[str], repeat: int
+) -> dict[str, Any]:
+    # Keep the fastest time for each stage, which is the least disturbed by everything else
+    # running on the machine
+    best_stages: dict[str, float] = {}
+    counts: dict[str, int] = {}
+    import_models()
+    for _ in range(repeat):
+        stages, counts = time_conversion(policy_lines)
+        for stage, seconds in stages.items():
+            best_stages[stage] = min(seconds, best_stages.get(stage, seconds))
+
+    # The standalone table and back-matter timings are already part of the other stages
+    total_seconds = sum(
+        seconds
+        for stage, seconds in best_stages.items()
+        if stage not in ("parse_html_table", "parse_backmatter")
+    )
+    return {
+        "name": name,
+        "input": input_name,
+        "scale": scale,
+        "counts": counts,
+        "stages": best_stages,
+        "total_seconds": total_seconds,
+        "lines_per_second": counts["lines"] / total_seconds,
+        "parts_per_second": counts["parts"] / total_seconds,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def benchmark_catalog_json(name: str, catalog_path: Path, repeat: int) -> dict[str, Any]:
+    # Load and re-serialize one of the generated catalogs, e.g. from oscal-json
+    catalog_json = catalog_path.read_text()
+    best_stages: dict[str, float] = {}
+    common_catalog = None
+    import_models()
+    for _ in range(repeat):
+        stages: dict[str, float] = {}
+        common_catalog = timed(
+            stages, "load", lambda: document.Document.model_validate_json(catalog_json)
+        )
+        timed(stages, "serialize", lambda: serialize_catalog(common_catalog))
+        for stage, seconds in stages.items():
+            best_stages[stage] = min(seconds, best_stages.get(stage, seconds))
+
+    counts = {"groups": 0, "controls": 0, "parts": 0}
+    if common_catalog is not None and common_catalog.catalog is not None:
+        counts = count_catalog_objects(common_catalog.catalog.groups or [])
+    total_seconds = sum(best_stages.values())
+    return {
+        "name": name,
+        "input": str(catalog_path),
+        "scale": 1,
+        "counts": counts,
+        "stages": best_stages,
+        "total_seconds": total_seconds,
+        "parts_per_second": counts["parts"] / total_seconds,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+# Imports timed by --import-time, each in a fresh interpreter. The parser and the CLI should
+# not import oscal_pydantic (models) until a catalog is actually built.
+IMPORT_CASES = {
+    "parser": "import oscal_common_cp.simple_oscal_parser",
+    "cli": "import oscal_common_cp.__main__",
+    "models": "import oscal_pydantic.document",
+}
+
+
+def benchmark_import(name: str, statement: str, repeat: int) -> dict[str, Any]:
+    timing_code = (
+        "import sys, time\n"
+        "start_time = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - start_time, 'oscal_pydantic' in sys.modules)\n"
+    )
+    # Make sure the child imports this copy of the package
+    package_root = str(Path(__file__).resolve().parent.parent)
+    best_seconds = None
+    loads_models = False
+    for _ in range(repeat):
+        child = subprocess.run(
+            [sys.executable, "-c", timing_code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=package_root,
+        )
+        seconds_text, loads_models_text = child.stdout.split()
+        seconds = float(seconds_text)
+        best_seconds = seconds if best_seconds is None else min(seconds, best_seconds)
+        loads_models = loads_models_text == "True"
+
+    return {
+        "name": name,
+        "input": statement,
+        "scale": 1,
+        "counts": {},
+        "stages": {"import": best_seconds},
+        "total_seconds": best_seconds,
+        "loads_models": loads_models,
+        "peak_rss_bytes": None,
+    }
+
+
+def run_isolated(benchmark: Callable[..., dict[str, Any]], *args: Any) -> dict[str, Any]:
+    # Every case gets a fresh process, so its peak RSS isn't left over from an earlier case
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(benchmark, *args).result()
+
+
+def run_benchmarks(
+    policy_paths: list[Path],
+    catalog_paths: list[Path],
+    scales: list[int],
+    repeat: int = 3,
+    synthetic_sections: list[int] | None = None,
+    import_time: bool = False,
+) -> dict[str, Any]:
+    cases: list[dict[str, Any]] = []
+    if import_time:
+        for import_name, statement in IMPORT_CASES.items():
+            cases.append(benchmark_import(f"import:{import_name}", statement, repeat))
+    for policy_path in policy_paths:
+        for scale in scales:
+            case_name = f"policy:{policy_path.name}:x{scale}"
+            cases.append(run_isolated(benchmark_policy, case_name, policy_path, scale, repeat))
+    for sections in synthetic_sections or []:
+        case_name = f"synthetic:{sections}"
+        cases.append(run_isolated(benchmark_synthetic, case_name, sections, repeat))
+    for catalog_path in catalog_paths:
+        case_name = f"catalog:{catalog_path.name}"
+        cases.append(run_isolated(benchmark_catalog_json, case_name, catalog_path, repeat))
+
+    return {
+        "parser_version": PARSER_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "repeat": repeat,
+        "cases": cases,
+    }
+
+
+def compare_results(
+    baseline: dict[str, Any], current: dict[str, Any], threshold: float = 0.1
+) -> list[str]:
+    # Report every stage that got more than threshold (10% by default) slower than in the
+    # baseline. Cases and stages that only appear in one of the runs are ignored.
+    regressions: list[str] = []
+    baseline_cases = {case["name"]: case for case in baseline["cases"]}
+    for case in current["cases"]:
+        baseline_case = baseline_cases.get(case["name"])
+        if baseline_case is None:
+            continue
+        stage_times = list(case["stages"].items()) + [("total", case["total_seconds"])]
+        baseline_times = dict(baseline_case["stages"], total=baseline_case["total_seconds"])
+        for stage, seconds in stage_times:
+            baseline_seconds = baseline_times.get(stage)
+            if baseline_seconds is None or baseline_seconds == 0:
+                continue
+            if seconds > baseline_seconds * (1 + threshold):
+                regressions.append(
+                    f"{case['name']} {stage}: {baseline_seconds:.4f}s -> {seconds:.4f}s "
+                    f"(+{(seconds / baseline_seconds - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def print_results(results: dict[str, Any]) -> None:
+    for case in results["cases"]:
+        print(case["name"])
+        for stage, seconds in case["stages"].items():
+            print(f"    {stage:<18} {seconds:10.4f}s")
+        print(f"    {'total':<18} {case['total_seconds']:10.4f}s")
+        if "lines_per_second" in case:
+            print(f"    {'lines/sec':<18} {case['lines_per_second']:10.0f}")
+        if "parts_per_second" in case:
+            print(f"    {'parts/sec':<18} {case['parts_per_second']:10.0f}")
+        if "loads_models" in case:
+            print(f"    {'loads models':<18} {str(case['loads_models']):>10}")
+        if case["peak_rss_bytes"] is not None:
+            print(f"    {'peak RSS':<18} {case['peak_rss_bytes'] / (1024 * 1024):10.1f} MB")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        prog="oscal_common_cp.benchmark",
+        description="Time each stage of converting tokenized Common Policy to an OSCAL catalog.",
+    )
+    arg_parser.add_argument(
+        "--scale",
+        dest="scales",
+        type=int,
+        nargs="+",
+        help="Time each of the given policies with its body repeated this many times, 1 being "
+        "the policy as it is (default: 1 10 100)",
+        default=[1, 10, 100],
+    )
+    arg_parser.add_argument(
+        "--repeat",
+        dest="repeat",
+        type=int,
+        help="Number of runs per case, the fastest is kept (default: 3)",
+        default=3,
+    )
+    arg_parser.add_argument(
+        "--synthetic",
+        dest="synthetic_sections",
+        type=int,
+        nargs="+",
+        help="Also time generated policies with this many sections (see synthetic_policy)",
+        default=[],
+    )
+    arg_parser.add_argument(
+        "--import-time",
+        dest="import_time",
+        action="store_true",
+        help="Also time importing the parser, the CLI and the oscal_pydantic models",
+    )
+    arg_parser.add_argument(
+        "--corpus",
+        dest="corpus",
+        type=Path,
+        help="Also time loading and serializing the generated catalogs in this directory, e.g. oscal-json",
+        default=None,
+    )
+    arg_parser.add_argument(
+        "-o",
+        "--output",
+        dest="output",
+        type=Path,
+        help="Write the results to this JSON file",
+        default=None,
+    )
+    arg_parser.add_argument(
+        "--compare",
+        dest="compare",
+        type=Path,
+        help="Results from an earlier run. Exits with 1 if any stage is slower by more than --threshold",
+        default=None,
+    )
+    arg_parser.add_argument(
+        "--threshold",
+        dest="threshold",
+        type=float,
+        help="Slowdown allowed by --compare, as a fraction (default: 0.1)",
+        default=0.1,
+    )
+    arg_parser.add_argument(
+        "policies",
+        type=Path,
+        nargs="*",
+        help="Tokenized policy markdown files to convert",
+    )
+
+    args = arg_parser.parse_args()
+
+    catalog_paths = list(find_catalogs(args.corpus).values()) if args.corpus is not None else []
+    if (
+        len(args.policies) == 0
+        and len(catalog_paths) == 0
+        and len(args.synthetic_sections) == 0
+        and not args.import_time
+    ):
+        print("Nothing to benchmark - provide policy files, --synthetic, --corpus and/or --import-time.")
+        arg_parser.print_help()
+        exit(1)
+
+    results = run_benchmarks(
+        args.policies,
+        catalog_paths,
+        args.scales,
+        args.repeat,
+        args.synthetic_sections,
+        args.import_time,
+    )
+    print_results(results)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=4))
+
+    if args.compare is not None:
+        regressions = compare_results(
+            json.loads(args.compare.read_text()), results, args.threshold
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            exit(1)
@@ -0,0 +1,409 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+import argparse
+import json
+import mmap
+import struct
+import sys
+import zlib
+
+from .catalog_writer import find_catalogs, load_catalog_json, write_catalog_file
+
+# A catalog in a form that can be mapped into memory and read in place. All integers are
+# little-endian and unsigned.
+#
+#   header         HEADER_FORMAT, see below
+#   string offsets string_count + 1 x u32; string i is data[offsets[i]:offsets[i + 1]]
+#   string data    UTF-8, every distinct string once
+#   node table     node_count x NODE_FORMAT, in breadth-first order, so the children of a
+#                  node are consecutive: first_child .. first_child + child_count - 1
+#   ID index       index_slots x (crc32 of the ID, byte offset of the node), open
+#                  addressing with linear probing; offset 0 marks an empty slot
+#
+# Node 0 is the catalog itself, with its UUID as its ID. Groups, controls and parts keep
+# their ID, title and prose as strings; any other fields go in "extra", as a JSON object.
+# The metadata and back-matter are stored as JSON strings, since lookups rarely need them.
+#
+# Looking up a control by ID is a hash, a probe or two and a string comparison against the
+# mapped file, with no parsing. Since the file is read-only and mapped, every process
+# reading it shares the same pages through the page cache.
+
+MAGIC = b"OSCALCPB"
+FORMAT_VERSION = 1
+HEADER_FORMAT = "<8sHHIIIIIIIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# kind, then the id, title, prose and extra string indexes, the parent node, the first child
+# node and the number of children
+NODE_FORMAT = "<B3xIIIIIII"
+NODE_SIZE = struct.calcsize(NODE_FORMAT)
+INDEX_SLOT_FORMAT = "<II"
+INDEX_SLOT_SIZE = struct.calcsize(INDEX_SLOT_FORMAT)
+
+# Marks a missing string, or the catalog node's missing parent
+NONE = 0xFFFFFFFF
+
+CATALOG_NODE = 0
+GROUP_NODE = 1
+CONTROL_NODE = 2
+PART_NODE = 3
+# The keys children are listed under, in the order they are stored and written back
+CHILD_KEYS = [("groups", GROUP_NODE), ("controls", CONTROL_NODE), ("parts", PART_NODE)]
+
+NODE_KEYS = frozenset(["id", "title", "prose", "groups", "controls", "parts"])
+CATALOG_KEYS = frozenset(["uuid", "metadata", "back-matter", "groups", "controls"])
+
+
+@dataclass(frozen=True, slots=True)
+class NodeRecord:
+    index: int
+    kind: int
+    id: int
+    title: int
+    prose: int
+    extra: int
+    parent: int
+    first_child: int
+    child_count: int
+
+
+def encode_binary_catalog(catalog_document: dict[str, Any]) -> bytes:
+    raw_catalog = catalog_document["catalog"]
+
+    strings: dict[str, int] = {}
+
+    def string_index(value: str | None) -> int:
+        if value is None:
+            return NONE
+        index = strings.get(value)
+        if index is None:
+            index = len(strings)
+            strings[value] = index
+        return index
+
+    def extra_index(raw_node: dict[str, Any], structural_keys: frozenset[str]) -> int:
+        extra = {key: value for key, value in raw_node.items() if key not in structural_keys}
+        if len(extra) == 0:
+            return NONE
+        return string_index(json.dumps(extra, ensure_ascii=False, separators=(",", ":")))
+
+    # Breadth first, so each node's children end up next to each other
+    nodes: list[list[int]] = [
+        [CATALOG_NODE, string_index(raw_catalog["uuid"]), NONE, NONE,
+         extra_index(raw_catalog, CATALOG_KEYS), NONE, 0, 0]
+    ]
+    raw_nodes: list[dict[str, Any]] = [raw_catalog]
+    position = 0
+    while position < len(nodes):
+        raw_node = raw_nodes[position]
+        nodes[position][6] = len(nodes)
+        for child_key, child_kind in CHILD_KEYS:
+            if position == 0 and child_key == "parts":
+                continue
+            for raw_child in raw_node.get(child_key, []):
+                nodes.append([
+                    child_kind,
+                    string_index(raw_child.get("id")),
+                    string_index(raw_child.get("title")),
+                    string_index(raw_child.get("prose")),
+                    extra_index(raw_child, NODE_KEYS),
+                    position,
+                    0,
+                    0,
+                ])
+                raw_nodes.append(raw_child)
+        nodes[position][7] = len(nodes) - nodes[position][6]
+        position += 1
+
+    metadata_index = string_index(
+        json.dumps(raw_catalog["metadata"], ensure_ascii=False, separators=(",", ":"))
+    )
+    back_matter_index = string_index(
+        json.dumps(raw_catalog.get("back-matter"), ensure_ascii=False, separators=(",", ":"))
+    )
+
+    encoded_strings = [value.encode("utf-8") for value in strings]
+    string_offsets = [0]
+    for encoded_string in encoded_strings:
+        string_offsets.append(string_offsets[-1] + len(encoded_string))
+    string_data = b"".join(encoded_strings)
+
+    string_offsets_offset = HEADER_SIZE
+    string_data_offset = string_offsets_offset + 4 * len(string_offsets)
+    # Keep the node table aligned for readers that map it as an array
+    node_table_offset = string_data_offset + len(string_data)
+    node_table_offset += -node_table_offset % 4
+    index_offset = node_table_offset + NODE_SIZE * len(nodes)
+
+    # At most half full, so probes stay short
+    index_slots = 1
+    while index_slots < 2 * len(nodes):
+        index_slots *= 2
+    index_table = bytearray(INDEX_SLOT_SIZE * index_slots)
+    indexed_ids: set[int] = set()
+    for node_position in document_order(raw_nodes):
+        id_index = nodes[node_position][1]
+        # The catalog's UUID isn't an ID anyone looks up, and the first of two nodes with
+        # the same ID in document order wins, as in LazyCatalog
+        if node_position == 0 or id_index == NONE or id_index in indexed_ids:
+            continue
+        indexed_ids.add(id_index)
+        id_hash = zlib.crc32(encoded_strings[id_index])
+        slot = id_hash & (index_slots - 1)
+        while struct.unpack_from(INDEX_SLOT_FORMAT, index_table, slot * INDEX_SLOT_SIZE)[1] != 0:
+            slot = (slot + 1) & (index_slots - 1)
+        struct.pack_into(
+            INDEX_SLOT_FORMAT,
+            index_table,
+            slot * INDEX_SLOT_SIZE,
+            id_hash,
+            node_table_offset + NODE_SIZE * node_position,
+        )
+
+    if index_offset + len(index_table) > NONE:
+        raise ValueError("The catalog is too large for the binary format")
+
+    header = struct.pack(
+        HEADER_FORMAT,
+        MAGIC,
+        FORMAT_VERSION,
+        NODE_SIZE,
+        len(encoded_strings),
+        string_offsets_offset,
+        string_data_offset,
+        len(nodes),
+        node_table_offset,
+        index_slots,
+        index_offset,
+        metadata_index,
+        back_matter_index,
+    )
+    return b"".join([
+        header,
+        struct.pack(f"<{len(string_offsets)}I", *string_offsets),
+        string_data,
+        bytes(node_table_offset - string_data_offset - len(string_data)),
+        b"".join(struct.pack(NODE_FORMAT, *node) for node in nodes),
+        index_table,
+    ])
+
+
+def document_order(raw_nodes: list[dict[str, Any]]) -> list[int]:
+    # The positions of the nodes in the (breadth-first) node table, in the order they appear
+    # in the JSON document. raw_nodes[0] is the catalog.
+    node_positions = {id(raw_node): position for position, raw_node in enumerate(raw_nodes)}
+    child_keys = [child_key for child_key, _ in CHILD_KEYS]
+    ordered_positions: list[int] = []
+    pending = [raw_nodes[0]]
+    while len(pending) > 0:
+        raw_node = pending.pop()
+        ordered_positions.append(node_positions[id(raw_node)])
+        raw_children = [
+            raw_child
+            for key, value in raw_node.items()
+            if key in child_keys and not (raw_node is raw_nodes[0] and key == "parts")
+            for raw_child in value
+        ]
+        # Last child first, so the first child comes off the stack next
+        pending.extend(reversed(raw_children))
+    return ordered_positions
+
+
+def write_binary_catalog(catalog_document: dict[str, Any], output_path: Path) -> Path:
+    catalog_bytes = encode_binary_catalog(catalog_document)
+    return write_catalog_file(
+        output_path, lambda catalog_file: catalog_file.write(catalog_bytes), mode="wb"
+    )
+
+
+def binary_catalog_path(catalog_path: Path) -> Path:
+    # Written next to the JSON catalog, with the same name
+    return catalog_path.with_suffix(".oscalb")
+
+
+class BinaryCatalog:
+    # Reads a catalog written by write_binary_catalog through a read-only memory map.
+    # Strings are only decoded when asked for; string_bytes() returns them without copying.
+
+    def __init__(self, catalog_path: Path) -> None:
+        with open(catalog_path, mode="rb") as catalog_file:
+            self.mapping = mmap.mmap(catalog_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mapping)
+
+        if len(self.buffer) < HEADER_SIZE:
+            self.close()
+            raise ValueError(f"{catalog_path} is not a binary catalog")
+        (
+            magic,
+            format_version,
+            node_size,
+            self.string_count,
+            self.string_offsets_offset,
+            self.string_data_offset,
+            self.node_count,
+            self.node_table_offset,
+            self.index_slots,
+            self.index_offset,
+            self.metadata_string,
+            self.back_matter_string,
+        ) = struct.unpack_from(HEADER_FORMAT, self.buffer)
+        if magic != MAGIC or format_version != FORMAT_VERSION or node_size != NODE_SIZE:
+            self.close()
+            raise ValueError(
+                f"{catalog_path} is not a version {FORMAT_VERSION} binary catalog"
+            )
+
+
+    def close(self) -> None:
+        # The view has to go before the mapping can be closed
+        self.buffer.release()
+        try:
+            self.mapping.close()
+        except BufferError:
+            # A string_bytes() view is still alive; the mapping is closed along with the last one
+            pass
+
+
+    def __enter__(self) -> "BinaryCatalog":
+        return self
+
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+    def string_bytes(self, index: int) -> memoryview:
+        start, end = struct.unpack_from("<II", self.buffer, self.string_offsets_offset + 4 * index)
+        return self.buffer[self.string_data_offset + start:self.string_data_offset + end]
+
+
+    def string(self, index: int) -> str | None:
+        if index == NONE:
+            return None
+        return str(self.string_bytes(index), "utf-8")
+
+
+    def node(self, index: int) -> NodeRecord:
+        return NodeRecord(
+            index, *struct.unpack_from(NODE_FORMAT, self.buffer, self.node_table_offset + NODE_SIZE * index)
+        )
+
+
+    def children(self, node: NodeRecord) -> Iterator[NodeRecord]:
+        for index in range(node.first_child, node.first_child + node.child_count):
+            yield self.node(index)
+
+
+    def find(self, node_id: str) -> NodeRecord | None:
+        # The group, control or part with this ID
+        encoded_id = node_id.encode("utf-8")
+        id_hash = zlib.crc32(encoded_id)
+        slot = id_hash & (self.index_slots - 1)
+        while True:
+            slot_hash, node_offset = struct.unpack_from(
+                INDEX_SLOT_FORMAT, self.buffer, self.index_offset + INDEX_SLOT_SIZE * slot
+            )
+            if node_offset == 0:
+                return None
+            if slot_hash == id_hash:
+                node = self.node((node_offset - self.node_table_offset) // NODE_SIZE)
+                if self.string_bytes(node.id) == encoded_id:
+                    return node
+            slot = (slot + 1) & (self.index_slots - 1)
+
+
+    def control(self, control_id: str) -> dict[str, Any] | None:
+        # The control as it appears in the JSON catalog, with its parts
+        node = self.find(control_id)
+        if node is None or node.kind != CONTROL_NODE:
+            return None
+        return self.node_dict(node)
+
+
+    def node_dict(self, node: NodeRecord) -> dict[str, Any]:
+        node_fields: dict[str, Any] = {}
+        if node.id != NONE:
+            node_fields["id"] = self.string(node.id)
+        if node.title != NONE:
+            node_fields["title"] = self.string(node.title)
+        if node.extra != NONE:
+            node_fields.update(json.loads(self.string(node.extra)))
+        if node.prose != NONE:
+            node_fields["prose"] = self.string(node.prose)
+        for child_key, child_kind in CHILD_KEYS:
+            children = [child for child in self.children(node) if child.kind == child_kind]
+            if len(children) > 0:
+                node_fields[child_key] = [self.node_dict(child) for child in children]
+        return node_fields
+
+
+    def metadata(self) -> dict[str, Any]:
+        return json.loads(self.string(self.metadata_string))
+
+
+    @property
+    def version(self) -> str:
+        return self.metadata()["version"]
+
+
+    def to_dict(self) -> dict[str, Any]:
+        # The whole catalog document, as json.loads would return the JSON catalog
+        catalog_node = self.node(0)
+        raw_catalog: dict[str, Any] = {
+            "uuid": self.string(catalog_node.id),
+            "metadata": self.metadata(),
+        }
+        if catalog_node.extra != NONE:
+            raw_catalog.update(json.loads(self.string(catalog_node.extra)))
+        for child_key, child_kind in CHILD_KEYS[:2]:
+            children = [child for child in self.children(catalog_node) if child.kind == child_kind]
+            if len(children) > 0:
+                raw_catalog[child_key] = [self.node_dict(child) for child in children]
+        back_matter = json.loads(self.string(self.back_matter_string))
+        if back_matter is not None:
+            raw_catalog["back-matter"] = back_matter
+        return {"catalog": raw_catalog}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        prog="oscal_common_cp.binary_catalog",
+        description="Write generated catalogs in the memory-mappable binary format, or look up controls in one.",
+    )
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+    build_parser = subcommands.add_parser(
+        "build", help="Write a .oscalb file next to each JSON catalog"
+    )
+    build_parser.add_argument(
+        "catalogs",
+        type=Path,
+        nargs="*",
+        help="JSON catalogs to convert (default: every catalog in ./oscal-json)",
+    )
+    lookup_parser = subcommands.add_parser("lookup", help="Print controls from a binary catalog")
+    lookup_parser.add_argument("catalog", type=Path, help="The .oscalb file")
+    lookup_parser.add_argument("control_ids", nargs="+", help="IDs of the controls to print")
+
+    args = arg_parser.parse_args()
+
+    if args.command == "build":
+        catalog_paths = args.catalogs
+        if len(catalog_paths) == 0:
+            catalog_paths = list(find_catalogs(Path.joinpath(Path.cwd(), "oscal-json")).values())
+        for catalog_path in catalog_paths:
+            output_path = write_binary_catalog(
+                load_catalog_json(catalog_path), binary_catalog_path(catalog_path)
+            )
+            print(f"Wrote {output_path}")
+    elif args.command == "lookup":
+        missing_ids = []
+        with BinaryCatalog(args.catalog) as binary_catalog:
+            for control_id in args.control_ids:
+                control = binary_catalog.control(control_id)
+                if control is None:
+                    missing_ids.append(control_id)
+                else:
+                    print(json.dumps(control, indent=4, ensure_ascii=False))
+        if len(missing_ids) > 0:
+            print(f"Not in {args.catalog.name}: {', '.join(missing_ids)}", file=sys.stderr)
+            exit(1)
@@ -0,0 +1,96 @@
+from pathlib import Path
+import hashlib
+import os
+
+from .simple_oscal_parser import OSCAL_VERSION, PARSER_VERSION
+
+
+def default_cache_dir() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if cache_home is None or cache_home == "":
+        return Path.joinpath(Path.home(), ".cache", "oscal-common-cp")
+    else:
+        return Path.joinpath(Path(cache_home), "oscal-common-cp")
+
+
+class ConversionCache:
+    # An on-disk cache of converted catalogs, keyed by a hash of the tokenized markdown
+    # plus everything else that affects the output. Each entry is a pair of files:
+    #   <key>.json - the serialized catalog
+    #   <key>.name - the filename the catalog is written out as
+    # Entries are evicted least-recently-used first once the cache grows past max_bytes.
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+
+    def key_for_file(self, policy_path: Path, *key_parts: str) -> str:
+        # Hash the file in chunks rather than reading it all in.
+        # key_parts are any other options that change the output, e.g. the parser type.
+        policy_hash = hashlib.sha256()
+        for key_part in (PARSER_VERSION, OSCAL_VERSION, *key_parts):
+            policy_hash.update(key_part.encode())
+            policy_hash.update(b"\0")
+
+        with open(policy_path, mode="rb") as policy_file:
+            while chunk := policy_file.read(1024 * 1024):
+                policy_hash.update(chunk)
+
+        return policy_hash.hexdigest()
+
+
+    def get(self, key: str) -> tuple[str, str] | None:
+        # Returns (catalog filename, catalog json), or None on a cache miss
+        json_path = Path.joinpath(self.cache_dir, f"{key}.json")
+        name_path = Path.joinpath(self.cache_dir, f"{key}.name")
+        try:
+            catalog_name = name_path.read_text()
+            catalog_json = json_path.read_text()
+        except FileNotFoundError:
+            # Not cached, or evicted by another process while we were reading
+            return None
+
+        # Mark the entry as recently used
+        os.utime(json_path)
+        return catalog_name, catalog_json
+
+
+    def put(self, key: str, catalog_name: str, catalog_json: str) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write the catalog before its name, since get() treats a missing name as a miss
+        self.write_entry_file(Path.joinpath(self.cache_dir, f"{key}.json"), catalog_json)
+        self.write_entry_file(Path.joinpath(self.cache_dir, f"{key}.name"), catalog_name)
+        self.evict()
+
+
+    def write_entry_file(self, entry_path: Path, contents: str) -> None:
+        # Several worker processes may share the cache, so never expose a partial entry
+        temp_path = entry_path.with_name(f".{entry_path.name}.{os.getpid()}.tmp")
+        try:
+            temp_path.write_text(contents)
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+
+    def evict(self) -> None:
+        entries: list[tuple[float, int, Path]] = []
+        total_bytes = 0
+        for json_path in self.cache_dir.glob("*.json"):
+            try:
+                entry_stat = json_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry_stat.st_mtime, entry_stat.st_size, json_path))
+            total_bytes += entry_stat.st_size
+
+        # Oldest first
+        entries.sort()
+        for _, entry_size, json_path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            json_path.with_suffix(".name").unlink(missing_ok=True)
+            json_path.unlink(missing_ok=True)
+            total_bytes -= entry_size
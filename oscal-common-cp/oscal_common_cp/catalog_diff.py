@@ -0,0 +1,382 @@
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Iterator
+import argparse
+import hashlib
+import json
+import sys
+
+from .catalog_writer import find_catalogs, load_catalog_json
+from .section_ids import title_to_id
+
+# Compares two generated catalogs, e.g. two versions of Common Policy from oscal-json. The
+# catalogs are read as plain JSON rather than through oscal_pydantic, since validating them
+# would take far longer than the comparison itself.
+#
+# Every group and control gets a content hash, built bottom-up. Groups with the same ID and
+# hash in both catalogs are identical all the way down, so they are skipped without looking
+# at any of their controls. What's left is aligned control by control: first by section
+# number and title, then by title alone (the section was renumbered), then by content (the
+# section was renamed). Statement parts of the controls that changed are aligned with
+# difflib.
+
+
+# Share of its statement text a control has to keep to count as retitled, rather than replaced
+RETITLE_SIMILARITY = 0.6
+
+
+def content_hash(*parts: str) -> bytes:
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(part.encode())
+        # Separator, so ("ab", "c") and ("a", "bc") hash differently
+        hasher.update(b"\x1f")
+    return hasher.digest()
+
+
+def normalize_title(title: str) -> str:
+    # The same normalization as the IDs, so case, spacing and punctuation changes don't count
+    return title_to_id(" ".join(title.split()))
+
+
+class CatalogControl:
+    # A control, with what we need to align and compare it
+    def __init__(self, control: dict[str, Any]) -> None:
+        self.control_id: str = control["id"]
+        self.title: str = control.get("title", "")
+        # Control IDs are "ctrl-<section number>-<title>"
+        self.section_number = self.control_id.split("-", 2)[1]
+        self.title_key = normalize_title(self.title)
+        parts = control.get("parts", [])
+        self.part_ids: list[str] = [part["id"] for part in parts]
+        self.prose: list[str] = [part.get("prose", "") for part in parts]
+        # Leaves out the section number, so a control that only moved still matches
+        self.content_hash = content_hash(self.title, *self.prose)
+
+
+class CatalogGroup:
+    def __init__(self, group: dict[str, Any]) -> None:
+        self.group_id: str = group["id"]
+        self.title: str = group.get("title", "")
+        self.controls = [CatalogControl(control) for control in group.get("controls", [])]
+        self.groups = [CatalogGroup(child) for child in group.get("groups", [])]
+        self.control_count = len(self.controls) + sum(
+            child.control_count for child in self.groups
+        )
+        self.content_hash = content_hash(
+            self.group_id,
+            self.title,
+            *(control.control_id + control.content_hash.hex() for control in self.controls),
+            *(child.content_hash.hex() for child in self.groups),
+        )
+
+
+    def all_controls(self) -> Iterator[CatalogControl]:
+        yield from self.controls
+        for child in self.groups:
+            yield from child.all_controls()
+
+
+class CatalogSnapshot:
+    # A loaded catalog: its version and its tree of groups
+    def __init__(self, catalog_document: dict[str, Any]) -> None:
+        catalog = catalog_document["catalog"]
+        self.version: str = catalog.get("metadata", {}).get("version", "")
+        self.groups = [CatalogGroup(group) for group in catalog.get("groups", [])]
+
+
+def load_snapshot(catalog_path: Path) -> CatalogSnapshot:
+    return CatalogSnapshot(load_catalog_json(catalog_path))
+
+
+class PartChange:
+    # kind is "added", "removed" or "modified"
+    def __init__(
+        self,
+        kind: str,
+        old_id: str | None = None,
+        new_id: str | None = None,
+        old_prose: str | None = None,
+        new_prose: str | None = None,
+    ) -> None:
+        self.kind = kind
+        self.old_id = old_id
+        self.new_id = new_id
+        self.old_prose = old_prose
+        self.new_prose = new_prose
+
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "change": self.kind,
+            "old_id": self.old_id,
+            "new_id": self.new_id,
+            "old_prose": self.old_prose,
+            "new_prose": self.new_prose,
+        }
+
+
+class ControlChange:
+    # kind is "added", "removed", "moved" (a different section number or title) or
+    # "modified" (same place, different statements). Moved controls can also have
+    # part_changes, if their statements changed too.
+    def __init__(
+        self,
+        kind: str,
+        old: CatalogControl | None = None,
+        new: CatalogControl | None = None,
+        part_changes: list[PartChange] | None = None,
+    ) -> None:
+        self.kind = kind
+        self.old = old
+        self.new = new
+        self.part_changes = part_changes if part_changes is not None else []
+
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "change": self.kind,
+            "old_id": self.old.control_id if self.old is not None else None,
+            "new_id": self.new.control_id if self.new is not None else None,
+            "old_section": self.old.section_number if self.old is not None else None,
+            "new_section": self.new.section_number if self.new is not None else None,
+            "title": (self.new if self.new is not None else self.old).title,
+            "parts": [part_change.to_dict() for part_change in self.part_changes],
+        }
+
+
+class CatalogDiff:
+    def __init__(self, old_version: str, new_version: str) -> None:
+        self.old_version = old_version
+        self.new_version = new_version
+        self.unchanged = 0
+        self.changes: list[ControlChange] = []
+
+
+    def summary(self) -> dict[str, int]:
+        summary = {"unchanged": self.unchanged}
+        for kind in ("added", "removed", "moved", "modified"):
+            summary[kind] = len([change for change in self.changes if change.kind == kind])
+        for kind in ("added", "removed", "modified"):
+            summary[f"parts_{kind}"] = sum(
+                len([part for part in change.part_changes if part.kind == kind])
+                for change in self.changes
+            )
+        return summary
+
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "old_version": self.old_version,
+            "new_version": self.new_version,
+            "summary": self.summary(),
+            "controls": [change.to_dict() for change in self.changes],
+        }
+
+
+    def format(self) -> str:
+        lines = [f"{self.old_version} -> {self.new_version}"]
+        lines.append(", ".join(f"{kind}: {count}" for kind, count in self.summary().items()))
+        markers = {"added": "+", "removed": "-", "moved": ">", "modified": "~"}
+        for change in self.changes:
+            if change.kind == "added" and change.new is not None:
+                description = f"{change.new.section_number} {change.new.title}"
+            elif change.kind == "removed" and change.old is not None:
+                description = f"{change.old.section_number} {change.old.title}"
+            elif change.old is not None and change.new is not None:
+                description = f"{change.old.section_number} {change.old.title}"
+                if change.kind == "moved":
+                    description += f" -> {change.new.section_number} {change.new.title}"
+            else:
+                continue
+            if len(change.part_changes) > 0:
+                description += f" ({len(change.part_changes)} statements changed)"
+            lines.append(f"{markers[change.kind]} {description}")
+        return "\n".join(lines)
+
+
+def diff_parts(old: CatalogControl, new: CatalogControl) -> list[PartChange]:
+    part_changes: list[PartChange] = []
+    matcher = SequenceMatcher(a=old.prose, b=new.prose, autojunk=False)
+    for opcode, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if opcode == "equal":
+            continue
+        old_indexes = list(range(old_start, old_end))
+        new_indexes = list(range(new_start, new_end))
+        if opcode == "replace":
+            # Pair the replaced statements up, anything left over was added or removed
+            paired = min(len(old_indexes), len(new_indexes))
+            for old_index, new_index in zip(old_indexes[:paired], new_indexes[:paired]):
+                part_changes.append(
+                    PartChange(
+                        "modified",
+                        old.part_ids[old_index],
+                        new.part_ids[new_index],
+                        old.prose[old_index],
+                        new.prose[new_index],
+                    )
+                )
+            old_indexes = old_indexes[paired:]
+            new_indexes = new_indexes[paired:]
+        for old_index in old_indexes:
+            part_changes.append(
+                PartChange("removed", old_id=old.part_ids[old_index], old_prose=old.prose[old_index])
+            )
+        for new_index in new_indexes:
+            part_changes.append(
+                PartChange("added", new_id=new.part_ids[new_index], new_prose=new.prose[new_index])
+            )
+    return part_changes
+
+
+def match_controls(
+    old_controls: list[CatalogControl],
+    new_controls: list[CatalogControl],
+    match_key,
+) -> tuple[list[tuple[CatalogControl, CatalogControl]], list[CatalogControl], list[CatalogControl]]:
+    # Pairs up controls with the same key, in document order. Returns the pairs and the
+    # controls left over on each side.
+    new_by_key: dict[Any, list[CatalogControl]] = {}
+    for new_control in new_controls:
+        new_by_key.setdefault(match_key(new_control), []).append(new_control)
+
+    pairs: list[tuple[CatalogControl, CatalogControl]] = []
+    unmatched_old: list[CatalogControl] = []
+    for old_control in old_controls:
+        candidates = new_by_key.get(match_key(old_control))
+        if candidates:
+            pairs.append((old_control, candidates.pop(0)))
+        else:
+            unmatched_old.append(old_control)
+
+    matched_new = {id(new_control) for _, new_control in pairs}
+    unmatched_new = [
+        new_control for new_control in new_controls if id(new_control) not in matched_new
+    ]
+    return pairs, unmatched_old, unmatched_new
+
+
+def diff_catalogs(old: CatalogSnapshot, new: CatalogSnapshot) -> CatalogDiff:
+    catalog_diff = CatalogDiff(old.version, new.version)
+
+    # Controls that could have changed, i.e. aren't inside a group identical in both
+    old_pool: list[CatalogControl] = []
+    new_pool: list[CatalogControl] = []
+
+    def align_groups(old_groups: list[CatalogGroup], new_groups: list[CatalogGroup]) -> None:
+        new_by_id: dict[str, list[CatalogGroup]] = {}
+        for new_group in new_groups:
+            new_by_id.setdefault(new_group.group_id, []).append(new_group)
+
+        for old_group in old_groups:
+            candidates = new_by_id.get(old_group.group_id)
+            if not candidates:
+                old_pool.extend(old_group.all_controls())
+                continue
+            new_group = candidates.pop(0)
+            if new_group.content_hash == old_group.content_hash:
+                # Identical subtree, nothing in it needs to be looked at
+                catalog_diff.unchanged += old_group.control_count
+                continue
+            old_pool.extend(old_group.controls)
+            new_pool.extend(new_group.controls)
+            align_groups(old_group.groups, new_group.groups)
+
+        for unmatched_groups in new_by_id.values():
+            for new_group in unmatched_groups:
+                new_pool.extend(new_group.all_controls())
+
+    align_groups(old.groups, new.groups)
+
+    # Same place in the document
+    pairs, old_pool, new_pool = match_controls(
+        old_pool, new_pool, lambda control: (control.section_number, control.title_key)
+    )
+    for old_control, new_control in pairs:
+        if old_control.content_hash == new_control.content_hash:
+            catalog_diff.unchanged += 1
+        else:
+            catalog_diff.changes.append(
+                ControlChange(
+                    "modified", old_control, new_control, diff_parts(old_control, new_control)
+                )
+            )
+
+    # Renumbered, then renamed
+    moved_pairs: list[tuple[CatalogControl, CatalogControl]] = []
+    for match_key in (lambda control: control.title_key, lambda control: control.content_hash):
+        pairs, old_pool, new_pool = match_controls(old_pool, new_pool, match_key)
+        moved_pairs.extend(pairs)
+
+    # Retitled in place, as long as the statements are still mostly the same
+    pairs, _, _ = match_controls(old_pool, new_pool, lambda control: control.section_number)
+    for old_control, new_control in pairs:
+        old_words = " ".join(old_control.prose).split()
+        new_words = " ".join(new_control.prose).split()
+        kept_words = sum(
+            block.size for block in SequenceMatcher(a=old_words, b=new_words).get_matching_blocks()
+        )
+        if kept_words >= RETITLE_SIMILARITY * max(len(old_words), 1):
+            moved_pairs.append((old_control, new_control))
+            old_pool.remove(old_control)
+            new_pool.remove(new_control)
+    for old_control, new_control in moved_pairs:
+        part_changes = []
+        if old_control.content_hash != new_control.content_hash:
+            part_changes = diff_parts(old_control, new_control)
+        catalog_diff.changes.append(ControlChange("moved", old_control, new_control, part_changes))
+
+    for old_control in old_pool:
+        catalog_diff.changes.append(ControlChange("removed", old=old_control))
+    for new_control in new_pool:
+        catalog_diff.changes.append(ControlChange("added", new=new_control))
+
+    return catalog_diff
+
+
+def resolve_catalog(catalog: str, catalog_dir: Path) -> Path:
+    # A catalog can be given as a path, or as a policy version found in catalog_dir
+    catalog_path = Path(catalog)
+    if catalog_path.is_file():
+        return catalog_path
+    catalog_paths = find_catalogs(catalog_dir)
+    if catalog in catalog_paths:
+        return catalog_paths[catalog]
+    raise FileNotFoundError(f"{catalog} is not a catalog file or a version in {catalog_dir}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        prog="oscal_common_cp.catalog_diff",
+        description="Compare the controls and statements of two generated catalogs.",
+    )
+    arg_parser.add_argument("old", help="The older catalog: a file, or a version such as 1.17")
+    arg_parser.add_argument("new", help="The newer catalog: a file, or a version such as 2.6")
+    arg_parser.add_argument(
+        "--catalog-dir",
+        dest="catalog_dir",
+        type=Path,
+        help="Where to find catalogs given by version (default: ./oscal-json)",
+        default=Path.joinpath(Path.cwd(), "oscal-json"),
+    )
+    arg_parser.add_argument(
+        "--json",
+        dest="json_output",
+        action="store_true",
+        help="Print the full diff, including statement text, as JSON",
+    )
+
+    args = arg_parser.parse_args()
+
+    try:
+        old_path = resolve_catalog(args.old, args.catalog_dir)
+        new_path = resolve_catalog(args.new, args.catalog_dir)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+
+    catalog_diff = diff_catalogs(load_snapshot(old_path), load_snapshot(new_path))
+    if args.json_output:
+        print(json.dumps(catalog_diff.to_dict(), indent=4))
+    else:
+        print(catalog_diff.format())
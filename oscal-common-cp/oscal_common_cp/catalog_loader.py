@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Iterator
+import argparse
+import json
+import sys
+
+from .catalog_writer import find_catalogs, load_catalog_json
+from .oscal_models import catalog, common, document
+
+
+class LazyCatalog:
+    # A catalog read back from JSON, e.g. from oscal-json, that is only validated as far as
+    # it is used. The file is parsed once into plain dicts. The metadata is validated right
+    # away; each group, control and the back-matter is validated the first time it is asked
+    # for, and kept. For one of the oscal-json catalogs, reading the version takes about a
+    # fifth of the time of validating the whole document, and looking up a single control
+    # after that is almost free.
+    #
+    # The objects handed out are the same ones a full document() is built from, so a
+    # control looked up by ID is the very object found in its group.
+
+    def __init__(self, catalog_document: dict[str, Any]) -> None:
+        self.raw_catalog: dict[str, Any] = catalog_document["catalog"]
+        self.metadata = common.Metadata.model_validate(self.raw_catalog["metadata"])
+        # Group index -> validated group. Controls are keyed by the identity of their dict in
+        # raw_catalog rather than their ID, since section titles aren't unique and two
+        # controls can end up with the same ID.
+        self.loaded_groups: dict[int, catalog.Group] = {}
+        self.loaded_controls: dict[int, catalog.Control] = {}
+        self.loaded_back_matter: common.BackMatter | None = None
+        # Control ID -> its dict in raw_catalog, built on the first lookup
+        self.control_index: dict[str, dict[str, Any]] | None = None
+
+
+    @classmethod
+    def from_path(cls, catalog_path: Path) -> LazyCatalog:
+        return cls(load_catalog_json(catalog_path))
+
+
+    @classmethod
+    def from_json(cls, catalog_json: str | bytes) -> LazyCatalog:
+        return cls(json.loads(catalog_json))
+
+
+    @property
+    def version(self) -> str:
+        return self.metadata.version
+
+
+    @property
+    def group_count(self) -> int:
+        return len(self.raw_catalog.get("groups", []))
+
+
+    def group(self, index: int) -> catalog.Group:
+        # A top-level group, with everything in it
+        group = self.loaded_groups.get(index)
+        if group is None:
+            group = self.load_group(self.raw_catalog["groups"][index])
+            self.loaded_groups[index] = group
+        return group
+
+
+    def groups(self) -> Iterator[catalog.Group]:
+        for index in range(self.group_count):
+            yield self.group(index)
+
+
+    def load_group(self, raw_group: dict[str, Any]) -> catalog.Group:
+        # Child groups and controls are validated on their own and passed in as models,
+        # which pydantic takes as they are rather than validating them again
+        group_fields = dict(raw_group)
+        if "groups" in raw_group:
+            group_fields["groups"] = [self.load_group(child) for child in raw_group["groups"]]
+        if "controls" in raw_group:
+            group_fields["controls"] = [
+                self.load_control(raw_control) for raw_control in raw_group["controls"]
+            ]
+        return catalog.Group.model_validate(group_fields)
+
+
+    def load_control(self, raw_control: dict[str, Any]) -> catalog.Control:
+        control = self.loaded_controls.get(id(raw_control))
+        if control is None:
+            control = catalog.Control.model_validate(raw_control)
+            self.loaded_controls[id(raw_control)] = control
+        return control
+
+
+    def control_ids(self) -> list[str]:
+        # Every control ID, in document order, without validating anything
+        return list(self.raw_controls())
+
+
+    def control(self, control_id: str) -> catalog.Control | None:
+        raw_control = self.raw_controls().get(control_id)
+        if raw_control is None:
+            return None
+        return self.load_control(raw_control)
+
+
+    def raw_controls(self) -> dict[str, dict[str, Any]]:
+        if self.control_index is None:
+            self.control_index = {}
+
+            def index_controls(raw_node: dict[str, Any]) -> None:
+                # In document order: the keys are walked in the order they were read, since
+                # e.g. a catalog lists its controls before its groups and a group the other
+                # way round. Controls can hold controls of their own.
+                for key, raw_children in raw_node.items():
+                    if key not in ("controls", "groups"):
+                        continue
+                    for raw_child in raw_children:
+                        if key == "controls":
+                            # The first of two controls with the same ID wins
+                            self.control_index.setdefault(raw_child["id"], raw_child)
+                        index_controls(raw_child)
+
+            index_controls(self.raw_catalog)
+        return self.control_index
+
+
+    def back_matter(self) -> common.BackMatter:
+        if self.loaded_back_matter is None:
+            self.loaded_back_matter = common.BackMatter.model_validate(
+                self.raw_catalog["back-matter"]
+            )
+        return self.loaded_back_matter
+
+
+    def document(self) -> document.Document:
+        # The whole catalog as a Document, validating whatever hasn't been yet
+        catalog_fields = dict(self.raw_catalog)
+        catalog_fields["metadata"] = self.metadata
+        if "groups" in self.raw_catalog:
+            catalog_fields["groups"] = list(self.groups())
+        if "controls" in self.raw_catalog:
+            catalog_fields["controls"] = [
+                self.load_control(raw_control) for raw_control in self.raw_catalog["controls"]
+            ]
+        catalog_fields["back-matter"] = self.back_matter()
+        return document.Document(catalog=catalog.Catalog.model_validate(catalog_fields))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        prog="oscal_common_cp.catalog_loader",
+        description="Print the version of a generated catalog, or look up controls in it.",
+    )
+    arg_parser.add_argument(
+        "catalog",
+        help="A catalog file, or a version in --catalog-dir such as 2.6",
+    )
+    arg_parser.add_argument(
+        "control_ids",
+        nargs="*",
+        help="IDs of controls to print as JSON, e.g. ctrl-5.9.0-circumstances-for-revocation",
+    )
+    arg_parser.add_argument(
+        "--catalog-dir",
+        dest="catalog_dir",
+        type=Path,
+        help="Where to find catalogs given by version (default: ./oscal-json)",
+        default=Path.joinpath(Path.cwd(), "oscal-json"),
+    )
+
+    args = arg_parser.parse_args()
+
+    catalog_path = Path(args.catalog)
+    if not catalog_path.is_file():
+        catalog_path = find_catalogs(args.catalog_dir).get(args.catalog)
+        if catalog_path is None:
+            print(f"{args.catalog} is not a catalog file or a version in {args.catalog_dir}", file=sys.stderr)
+            exit(1)
+
+    lazy_catalog = LazyCatalog.from_path(catalog_path)
+    if len(args.control_ids) == 0:
+        print(lazy_catalog.version)
+
+    missing_ids = []
+    for control_id in args.control_ids:
+        control = lazy_catalog.control(control_id)
+        if control is None:
+            missing_ids.append(control_id)
+        else:
+            print(control.model_dump_json(indent=4, by_alias=True, exclude_none=True))
+    if len(missing_ids) > 0:
+        print(f"Not in {catalog_path.name}: {', '.join(missing_ids)}", file=sys.stderr)
+        exit(1)
@@ -0,0 +1,313 @@
+from pathlib import Path
+from typing import Any
+import argparse
+import hashlib
+import json
+import sys
+
+from .catalog_diff import content_hash
+from .catalog_writer import catalog_output_path, find_catalogs, write_catalog_json
+
+# Bumped whenever the layout of the store changes
+STORE_FORMAT = 1
+
+# Keys whose string values go into the blob store. Titles and statement prose are the bulk
+# of a catalog, and almost all of them are the same from one version to the next.
+INTERNED_KEYS = frozenset(["title", "prose"])
+# Keys holding lists of objects that each go into the blob store whole. Most groups and
+# controls are unchanged from one version to the next, and so are the revision history and
+# the references, so each version only adds the few that changed.
+NODE_KEYS = frozenset(["groups", "controls", "revisions", "resources"])
+
+# How a catalog file was laid out, so it can be written back byte for byte. "verbatim"
+# catalogs matched none of the others and are kept whole, as a single blob.
+LAYOUTS = ["indent-4", "indent-2", "compact", "verbatim"]
+
+
+def dump_layout(catalog_dict: dict[str, Any], layout: str) -> str:
+    if layout == "indent-4":
+        # pydantic's model_dump_json(indent=4)
+        return json.dumps(catalog_dict, indent=4, ensure_ascii=False)
+    elif layout == "indent-2":
+        # orjson with OPT_INDENT_2
+        return json.dumps(catalog_dict, indent=2, ensure_ascii=False)
+    elif layout == "compact":
+        return json.dumps(catalog_dict, ensure_ascii=False, separators=(",", ":"))
+    raise ValueError(f"Unknown layout {layout}, expected one of {LAYOUTS}")
+
+
+def detect_layout(catalog_json: str, catalog_dict: dict[str, Any]) -> str:
+    for layout in LAYOUTS[:-1]:
+        if dump_layout(catalog_dict, layout) == catalog_json:
+            return layout
+    return "verbatim"
+
+
+class CatalogStore:
+    # A directory holding any number of catalog versions, with each distinct title,
+    # statement, control and group stored only once:
+    #
+    #   blobs.jsonl      [hash, blob] per line, only ever appended to
+    #   manifest.json    version -> file name, root blob, layout and sha256
+    #
+    # A blob is either a string, or an object whose titles, prose and child nodes have been
+    # replaced by the hashes of their own blobs. Each version is the blob of its whole
+    # document, so identical subtrees are shared between versions all the way down.
+    #
+    # Catalogs read back from the store share their unchanged subtrees and strings with
+    # each other, so holding every version in memory at once costs little more than holding
+    # one. They must be treated as read-only for the same reason.
+
+    def __init__(self, store_dir: Path) -> None:
+        self.store_dir = store_dir
+        self.manifest_path = Path.joinpath(store_dir, "manifest.json")
+        self.blobs_path = Path.joinpath(store_dir, "blobs.jsonl")
+
+        self.catalogs: dict[str, dict[str, str]] = {}
+        if self.manifest_path.exists():
+            manifest = json.loads(self.manifest_path.read_text())
+            if manifest.get("format") != STORE_FORMAT:
+                raise ValueError(
+                    f"{store_dir} is a format {manifest.get('format')} store, expected {STORE_FORMAT}"
+                )
+            self.catalogs = manifest["catalogs"]
+        # Read in when first needed
+        self._blobs: dict[str, Any] | None = None
+        # Blob hash -> the subtree already restored from it, shared by every version using it
+        self.restored: dict[str, Any] = {}
+
+
+    @property
+    def blobs(self) -> dict[str, Any]:
+        if self._blobs is None:
+            self._blobs = {}
+            if self.blobs_path.exists():
+                with open(self.blobs_path, encoding="utf-8") as blobs_file:
+                    for line in blobs_file:
+                        blob_hash, blob = json.loads(line)
+                        self._blobs[blob_hash] = blob
+        return self._blobs
+
+
+    def versions(self) -> list[str]:
+        return list(self.catalogs)
+
+
+    def add_catalogs(self, catalog_dir: Path) -> list[str]:
+        # Add every catalog in catalog_dir the store doesn't already have an identical copy of
+        added_versions: list[str] = []
+        for version, catalog_path in find_catalogs(catalog_dir).items():
+            if self.add_catalog(version, catalog_path):
+                added_versions.append(version)
+        return added_versions
+
+
+    def add_catalog(self, version: str, catalog_path: Path) -> bool:
+        # Returns False if this exact catalog was already stored under the version
+        catalog_bytes = catalog_path.read_bytes()
+        catalog_sha256 = hashlib.sha256(catalog_bytes).hexdigest()
+        if self.catalogs.get(version, {}).get("sha256") == catalog_sha256:
+            return False
+
+        catalog_json = catalog_bytes.decode("utf-8")
+        new_blobs: dict[str, Any] = {}
+        try:
+            catalog_dict = json.loads(catalog_json)
+            layout = detect_layout(catalog_json, catalog_dict)
+            if layout != "verbatim":
+                root_hash = self.intern_node(catalog_dict, new_blobs)
+        except ValueError:
+            # Not JSON, or not shaped like a catalog
+            layout = "verbatim"
+        if layout == "verbatim":
+            root_hash = self.intern(catalog_json, new_blobs)
+
+        # Blobs are on disk before the manifest refers to them
+        if len(new_blobs) > 0:
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.blobs_path, mode="a", encoding="utf-8") as blobs_file:
+                for blob_hash, blob in new_blobs.items():
+                    blobs_file.write(json.dumps([blob_hash, blob], ensure_ascii=False) + "\n")
+
+        self.catalogs[version] = {
+            "filename": catalog_path.name,
+            "root": root_hash,
+            "layout": layout,
+            "sha256": catalog_sha256,
+        }
+        self.save_manifest()
+        return True
+
+
+    def save_manifest(self) -> None:
+        write_catalog_json(
+            json.dumps({"format": STORE_FORMAT, "catalogs": self.catalogs}, indent=4),
+            self.manifest_path,
+        )
+
+
+    def intern(self, text: str, new_blobs: dict[str, Any]) -> str:
+        return self.add_blob(content_hash(text).hex(), text, new_blobs)
+
+
+    def intern_node(self, node: dict[str, Any], new_blobs: dict[str, Any]) -> str:
+        node_blob = self.intern_children(node, new_blobs)
+        node_json = json.dumps(node_blob, ensure_ascii=False, separators=(",", ":"))
+        return self.add_blob(content_hash(node_json).hex(), node_blob, new_blobs)
+
+
+    def add_blob(self, blob_hash: str, blob: Any, new_blobs: dict[str, Any]) -> str:
+        if blob_hash not in self.blobs:
+            self.blobs[blob_hash] = blob
+            new_blobs[blob_hash] = blob
+        return blob_hash
+
+
+    def intern_children(self, node: Any, new_blobs: dict[str, Any]) -> Any:
+        if isinstance(node, dict):
+            node_blob: dict[str, Any] = {}
+            for key, value in node.items():
+                if key in INTERNED_KEYS and isinstance(value, str):
+                    node_blob[key] = self.intern(value, new_blobs)
+                elif key in NODE_KEYS and isinstance(value, list):
+                    if not all(isinstance(item, dict) for item in value):
+                        # Hashes in these lists are read back as nodes, so only nodes may go in
+                        raise ValueError(f"Expected a list of objects in {key}")
+                    node_blob[key] = [self.intern_node(item, new_blobs) for item in value]
+                else:
+                    node_blob[key] = self.intern_children(value, new_blobs)
+            return node_blob
+        elif isinstance(node, list):
+            return [self.intern_children(item, new_blobs) for item in node]
+        return node
+
+
+    def restore_node(self, blob_hash: str) -> Any:
+        node = self.restored.get(blob_hash)
+        if node is None:
+            node = self.restore_children(self.blobs[blob_hash])
+            self.restored[blob_hash] = node
+        return node
+
+
+    def restore_children(self, node_blob: Any) -> Any:
+        if isinstance(node_blob, dict):
+            node: dict[str, Any] = {}
+            for key, value in node_blob.items():
+                if key in INTERNED_KEYS and isinstance(value, str):
+                    node[key] = self.blobs[value]
+                elif key in NODE_KEYS and isinstance(value, list):
+                    node[key] = [self.restore_node(item) for item in value]
+                else:
+                    node[key] = self.restore_children(value)
+            return node
+        elif isinstance(node_blob, list):
+            return [self.restore_children(item) for item in node_blob]
+        return node_blob
+
+
+    def stored_catalog(self, version: str) -> dict[str, str]:
+        if version not in self.catalogs:
+            raise KeyError(f"Version {version} is not in the store")
+        return self.catalogs[version]
+
+
+    def catalog_dict(self, version: str) -> dict[str, Any]:
+        # The catalog document, as json.loads would have returned it. Shared with the other
+        # versions, so don't modify it.
+        stored_catalog = self.stored_catalog(version)
+        if stored_catalog["layout"] == "verbatim":
+            return json.loads(self.blobs[stored_catalog["root"]])
+        return self.restore_node(stored_catalog["root"])
+
+
+    def catalog_json(self, version: str) -> str:
+        # The catalog file, exactly as it was added
+        stored_catalog = self.stored_catalog(version)
+        if stored_catalog["layout"] == "verbatim":
+            return self.blobs[stored_catalog["root"]]
+        return dump_layout(self.catalog_dict(version), stored_catalog["layout"])
+
+
+    def extract(self, version: str, output_dir: Path) -> Path:
+        output_path = catalog_output_path(output_dir, self.catalogs[version]["filename"])
+        catalog_json = self.catalog_json(version)
+        if hashlib.sha256(catalog_json.encode("utf-8")).hexdigest() != self.catalogs[version]["sha256"]:
+            raise ValueError(f"Version {version} does not match the catalog it was stored from")
+        return write_catalog_json(catalog_json, output_path)
+
+
+    def sizes(self) -> dict[str, int]:
+        return {
+            "versions": len(self.catalogs),
+            "blobs": len(self.blobs),
+            "store_bytes": self.blobs_path.stat().st_size if self.blobs_path.exists() else 0,
+            "catalog_bytes": sum(
+                len(self.catalog_json(version).encode("utf-8"))
+                for version in self.catalogs
+            ),
+        }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        prog="oscal_common_cp.catalog_store",
+        description="Keep every catalog version in one store, with repeated text stored once.",
+    )
+    arg_parser.add_argument("store_dir", type=Path, help="The store directory")
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+    add_parser = subcommands.add_parser("add", help="Add the catalogs in a directory to the store")
+    add_parser.add_argument(
+        "catalog_dir",
+        type=Path,
+        nargs="?",
+        help="Directory of catalogs (default: ./oscal-json)",
+        default=Path.joinpath(Path.cwd(), "oscal-json"),
+    )
+    extract_parser = subcommands.add_parser("extract", help="Write catalog versions back out")
+    extract_parser.add_argument("versions", nargs="*", help="Versions to extract (default: all)")
+    extract_parser.add_argument(
+        "-o",
+        "--output-dir",
+        dest="output_dir",
+        type=Path,
+        help="Where to write the catalogs (default: ./oscal-json)",
+        default=Path.joinpath(Path.cwd(), "oscal-json"),
+    )
+    extract_parser.add_argument(
+        "--stdout",
+        dest="stdout",
+        action="store_true",
+        help="Write a single version to stdout instead",
+    )
+    subcommands.add_parser("list", help="List the stored versions and the store's size")
+
+    args = arg_parser.parse_args()
+
+    try:
+        catalog_store = CatalogStore(args.store_dir)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+
+    if args.command == "add":
+        added_versions = catalog_store.add_catalogs(args.catalog_dir)
+        print(f"Added {len(added_versions)} versions: {', '.join(added_versions)}")
+    elif args.command == "extract":
+        versions = args.versions if len(args.versions) > 0 else catalog_store.versions()
+        unknown_versions = [version for version in versions if version not in catalog_store.catalogs]
+        if len(unknown_versions) > 0:
+            print(f"Not in the store: {', '.join(unknown_versions)}", file=sys.stderr)
+            exit(1)
+        if args.stdout:
+            if len(versions) != 1:
+                print("--stdout takes a single version", file=sys.stderr)
+                exit(1)
+            sys.stdout.write(catalog_store.catalog_json(versions[0]))
+        else:
+            for version in versions:
+                print(f"Wrote {catalog_store.extract(version, args.output_dir)}")
+    elif args.command == "list":
+        for version, stored_catalog in catalog_store.catalogs.items():
+            print(f"{version}: {stored_catalog['filename']}")
+        print(json.dumps(catalog_store.sizes(), indent=4))
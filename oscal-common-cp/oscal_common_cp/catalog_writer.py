@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable, TextIO
+import json
+import os
+import re
+
+from .oscal_models import base, common, document
+from .simple_oscal_parser import CatalogStream
+
+try:
+    # orjson is optional (the "orjson" extra). When it is installed it is used to serialize
+    # compact catalogs, which is considerably faster than pydantic's own JSON output for
+    # documents of this size.
+    import orjson
+except ImportError:
+    orjson = None
+
+SERIALIZERS = ["auto", "orjson", "pydantic"]
+
+# The policy version in a catalog file name: the part between the title and "-oscal-"
+catalog_version_re = re.compile(r"-(?P<version>[^-]+)-oscal-[^-]+-[^-]+\.json$")
+
+
+def catalog_filename(common_catalog: document.Document, parser_type: str) -> str:
+    if common_catalog.catalog is None:
+        raise ValueError("Could not parse catalog")
+
+    return metadata_filename(common_catalog.catalog.metadata, parser_type)
+
+
+def metadata_filename(metadata: common.Metadata, parser_type: str) -> str:
+    title = metadata.title
+    version = metadata.version
+    oscal_version = metadata.oscal_version
+    return f"{title}-{version}-oscal-{oscal_version}-{parser_type}.json"
+
+
+def find_catalogs(catalog_dir: Path) -> dict[str, Path]:
+    # Policy version -> catalog file, for the catalogs written by metadata_filename(),
+    # ordered from the oldest version to the newest
+    catalog_paths: dict[str, Path] = {}
+    for catalog_path in catalog_dir.glob("*.json"):
+        version_match = catalog_version_re.search(catalog_path.name)
+        if version_match is not None:
+            catalog_paths[version_match.group("version")] = catalog_path
+    return dict(sorted(catalog_paths.items(), key=lambda item: version_sort_key(item[0])))
+
+
+def load_catalog_json(catalog_path: Path) -> dict[str, Any]:
+    # Parse a catalog file into plain dicts and lists, without any model validation
+    if orjson is not None:
+        return orjson.loads(catalog_path.read_bytes())
+    return json.loads(catalog_path.read_text())
+
+
+def catalog_output_path(output_dir: Path, catalog_name: str) -> Path:
+    # The catalog name is built from the policy's own version line, so it must not be able
+    # to reach outside output_dir, e.g. with "Version 1/../../elsewhere"
+    output_path = Path.joinpath(output_dir, catalog_name)
+    if (
+        Path(catalog_name).name != catalog_name
+        or output_path.resolve().parent != output_dir.resolve()
+    ):
+        raise ValueError(f"The catalog name {catalog_name!r} is not a plain file name")
+    return output_path
+
+
+def version_sort_key(version: str) -> tuple[tuple[int, str], ...]:
+    # "1.9" sorts before "1.10", which sorts before "2.0"
+    return tuple(
+        (int(part), "") if part.isdigit() else (-1, part) for part in version.split(".")
+    )
+
+
+def serialize_catalog(
+    common_catalog: document.Document, serializer: str = "auto", pretty: bool = True
+) -> str:
+    # All serializers produce the same JSON document (aliases, no null values), only the
+    # whitespace differs: pydantic indents by 4 and orjson by 2 when pretty is set.
+    return encode_model(common_catalog, resolve_serializer(serializer, pretty), pretty)
+
+
+def resolve_serializer(serializer: str, pretty: bool = True) -> str:
+    # "auto" only picks orjson for compact output, where both serializers write the same
+    # bytes. Pretty catalogs keep pydantic's 4 space indent, as in oscal-json, whatever is
+    # installed.
+    if serializer == "auto":
+        return "orjson" if orjson is not None and not pretty else "pydantic"
+    elif serializer == "orjson" and orjson is None:
+        raise ValueError("The orjson serializer was requested, but orjson is not installed.")
+    elif serializer not in SERIALIZERS:
+        raise ValueError(f"Unknown serializer {serializer}, expected one of {SERIALIZERS}")
+    return serializer
+
+
+def encode_model(model: base.OscalModel, serializer: str, pretty: bool) -> str:
+    # serializer must already be resolved, i.e. not "auto"
+    if serializer == "orjson":
+        model_dict = model.model_dump(mode="json", by_alias=True, exclude_none=True)
+        return orjson.dumps(model_dict, option=orjson.OPT_INDENT_2 if pretty else None).decode()
+    else:
+        return model.model_dump_json(indent=4 if pretty else None)
+
+
+def stream_catalog_json(
+    catalog_stream: CatalogStream,
+    catalog_file: TextIO,
+    serializer: str = "auto",
+    pretty: bool = True,
+) -> None:
+    # Write the catalog a piece at a time: the envelope and metadata first, then each
+    # top-level group as soon as it has been built, then the back-matter. Only one group is
+    # held in memory at once, and the output matches serialize_catalog() byte for byte.
+    serializer = resolve_serializer(serializer, pretty)
+    indent_width = 2 if serializer == "orjson" else 4
+
+    def newline(level: int) -> str:
+        return "\n" + " " * (indent_width * level) if pretty else ""
+
+    def encode_at(model: base.OscalModel, level: int) -> str:
+        # Shift a separately encoded model over to its depth in the document. Newlines can
+        # only be whitespace here, since JSON escapes them inside strings.
+        encoded = encode_model(model, serializer, pretty)
+        return encoded.replace("\n", newline(level)) if pretty else encoded
+
+    key_separator = ": " if pretty else ":"
+
+    catalog_file.write("{" + newline(1) + '"catalog"' + key_separator + "{")
+    catalog_file.write(newline(2) + '"uuid"' + key_separator + json.dumps(str(catalog_stream.uuid)))
+    catalog_file.write("," + newline(2) + '"metadata"' + key_separator)
+    catalog_file.write(encode_at(catalog_stream.metadata, 2))
+    catalog_file.write("," + newline(2) + '"groups"' + key_separator + "[")
+
+    group_count = 0
+    for group in catalog_stream.groups:
+        if group_count > 0:
+            catalog_file.write(",")
+        catalog_file.write(newline(3) + encode_at(group, 3))
+        # Let readers on the other end of a pipe start on the group straight away
+        catalog_file.flush()
+        group_count += 1
+
+    if group_count > 0:
+        catalog_file.write(newline(2))
+    catalog_file.write("]")
+    catalog_file.write("," + newline(2) + '"back-matter"' + key_separator)
+    catalog_file.write(encode_at(catalog_stream.back_matter(), 2))
+    catalog_file.write(newline(1) + "}" + newline(0) + "}")
+    catalog_file.flush()
+
+
+def write_catalog(
+    common_catalog: document.Document,
+    output_path: Path,
+    serializer: str = "auto",
+    pretty: bool = True,
+) -> Path:
+    return write_catalog_json(serialize_catalog(common_catalog, serializer, pretty), output_path)
+
+
+def write_catalog_json(catalog_json: str, output_path: Path) -> Path:
+    return write_catalog_file(output_path, lambda catalog_file: catalog_file.write(catalog_json))
+
+
+def write_catalog_stream(
+    catalog_stream: CatalogStream,
+    output_path: Path,
+    serializer: str = "auto",
+    pretty: bool = True,
+) -> Path:
+    return write_catalog_file(
+        output_path,
+        lambda catalog_file: stream_catalog_json(catalog_stream, catalog_file, serializer, pretty),
+    )
+
+
+def write_catalog_file(
+    output_path: Path, write_contents: Callable[[TextIO], Any], mode: str = "w"
+) -> Path:
+    # Write to a temporary file next to the output and move it into place once it is
+    # complete, so a failed conversion never leaves a partial file behind. Readers that
+    # still have the old file open or mapped keep seeing the old contents. mode is "wb" for
+    # binary output.
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # The process ID keeps parallel conversions from sharing a temporary file
+    temp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(file=temp_path, mode=mode) as catalog_file:
+            write_contents(catalog_file)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return output_path
@@ -0,0 +1,273 @@
+from pathlib import Path
+from typing import Any
+import argparse
+import hashlib
+import json
+import sys
+
+from .cache import default_cache_dir
+from .catalog_diff import CatalogSnapshot, content_hash, load_snapshot
+from .catalog_writer import find_catalogs, load_catalog_json, version_sort_key, write_catalog_json
+
+# Bumped whenever the layout of the index file changes, so old indexes get rebuilt
+INDEX_FORMAT = 1
+
+
+def default_index_path(catalog_dir: Path) -> Path:
+    # The index is kept in the cache rather than next to the catalogs, since oscal-json is
+    # committed. Each catalog directory gets an index of its own.
+    catalog_dir_hash = hashlib.sha256(str(catalog_dir.resolve()).encode()).hexdigest()[:16]
+    return Path.joinpath(default_cache_dir(), "change-history", f"{catalog_dir_hash}.json")
+
+
+def catalog_fingerprint(catalog_path: Path) -> list[Any]:
+    # Enough to notice that a catalog was regenerated since it was indexed
+    catalog_stat = catalog_path.stat()
+    return [catalog_path.name, catalog_stat.st_size, catalog_stat.st_mtime_ns]
+
+
+class ChangeHistory:
+    # For every control and statement ID across the catalog versions, the runs of
+    # consecutive versions in which it appeared with the same text:
+    #
+    #   "stmt-5.9.0-circumstances-for-revocation-2": [
+    #       {"first": "1.17", "last": "1.32", "hash": "...", "text": "Examples of ... are—"},
+    #       {"first": "2.0", "last": "2.6", "hash": "...", "text": "Examples of ... are:"},
+    #   ]
+    #
+    # A new run starts when the text changes, or when the ID comes back after missing from
+    # some versions. Control runs are keyed on the title and all of the control's
+    # statements, and carry the title as their text; statement runs carry the prose.
+    #
+    # Versions are indexed from oldest to newest. Newer versions are appended to the runs
+    # as they show up; anything else (a regenerated catalog, an older version turning up
+    # late) rebuilds the index, which only takes a second or so.
+
+    def __init__(self) -> None:
+        self.versions: list[str] = []
+        # Version -> catalog_fingerprint() of the file it was indexed from
+        self.sources: dict[str, list[Any]] = {}
+        self.controls: dict[str, list[dict[str, str]]] = {}
+        self.statements: dict[str, list[dict[str, str]]] = {}
+
+
+    @classmethod
+    def load(cls, index_path: Path) -> "ChangeHistory":
+        # An empty history if there is no index yet, or it was written in another format
+        change_history = cls()
+        if not index_path.exists():
+            return change_history
+        index = load_catalog_json(index_path)
+        if index.get("format") != INDEX_FORMAT:
+            return change_history
+        change_history.versions = index["versions"]
+        change_history.sources = index["sources"]
+        change_history.controls = index["controls"]
+        change_history.statements = index["statements"]
+        return change_history
+
+
+    def save(self, index_path: Path) -> None:
+        index = {
+            "format": INDEX_FORMAT,
+            "versions": self.versions,
+            "sources": self.sources,
+            "controls": self.controls,
+            "statements": self.statements,
+        }
+        write_catalog_json(json.dumps(index), index_path)
+
+
+    def update(self, catalog_dir: Path) -> list[str]:
+        # Bring the index up to date with the catalogs in catalog_dir. Returns the versions
+        # that were (re)indexed.
+        catalog_paths = find_catalogs(catalog_dir)
+        fingerprints = {
+            version: catalog_fingerprint(catalog_path)
+            for version, catalog_path in catalog_paths.items()
+        }
+        new_versions = [version for version in catalog_paths if version not in self.sources]
+
+        indexed_unchanged = all(
+            fingerprints.get(version) == self.sources[version] for version in self.versions
+        )
+        appends_only = len(new_versions) == 0 or len(self.versions) == 0 or (
+            version_sort_key(new_versions[0]) > version_sort_key(self.versions[-1])
+        )
+        if not indexed_unchanged or not appends_only:
+            self.__init__()
+            new_versions = list(catalog_paths)
+
+        for version in new_versions:
+            self.add_version(version, load_snapshot(catalog_paths[version]))
+            self.sources[version] = fingerprints[version]
+        return new_versions
+
+
+    def add_version(self, version: str, snapshot: CatalogSnapshot) -> None:
+        # version must be newer than every version already indexed
+        previous_version = self.versions[-1] if len(self.versions) > 0 else None
+        for group in snapshot.groups:
+            for control in group.all_controls():
+                self.record(
+                    self.controls,
+                    control.control_id,
+                    version,
+                    previous_version,
+                    control.content_hash.hex(),
+                    control.title,
+                )
+                for part_id, prose in zip(control.part_ids, control.prose):
+                    self.record(
+                        self.statements,
+                        part_id,
+                        version,
+                        previous_version,
+                        content_hash(prose).hex(),
+                        prose,
+                    )
+        self.versions.append(version)
+
+
+    def record(
+        self,
+        runs_by_id: dict[str, list[dict[str, str]]],
+        item_id: str,
+        version: str,
+        previous_version: str | None,
+        text_hash: str,
+        text: str,
+    ) -> None:
+        runs = runs_by_id.setdefault(item_id, [])
+        if len(runs) > 0:
+            last_run = runs[-1]
+            if last_run["last"] == version:
+                # The same ID twice in one version; the first one wins, as in a lookup by ID
+                return
+            if last_run["last"] == previous_version and last_run["hash"] == text_hash:
+                last_run["last"] = version
+                return
+        runs.append({"first": version, "last": version, "hash": text_hash, "text": text})
+
+
+    def runs(self, item_id: str) -> list[dict[str, str]] | None:
+        if item_id in self.controls:
+            return self.controls[item_id]
+        return self.statements.get(item_id)
+
+
+    def versions_of(self, item_id: str) -> list[str]:
+        # Every indexed version the ID appears in
+        version_positions = {version: position for position, version in enumerate(self.versions)}
+        versions: list[str] = []
+        for run in self.runs(item_id) or []:
+            versions.extend(
+                self.versions[version_positions[run["first"]]:version_positions[run["last"]] + 1]
+            )
+        return versions
+
+
+    def history(self, item_id: str) -> dict[str, Any] | None:
+        runs = self.runs(item_id)
+        if runs is None:
+            return None
+        return {
+            "id": item_id,
+            "kind": "control" if item_id in self.controls else "statement",
+            "versions": self.versions_of(item_id),
+            # Versions whose text differs from the version before, not counting first appearances
+            "changed_in": [
+                run["first"]
+                for previous_run, run in zip(runs, runs[1:])
+                if previous_run["hash"] != run["hash"]
+            ],
+            "variants": runs,
+        }
+
+
+def format_history(history: dict[str, Any]) -> str:
+    lines = [f"{history['id']} ({history['kind']}, in {len(history['versions'])} versions)"]
+    previous_run = None
+    for run in history["variants"]:
+        version_range = run["first"] if run["first"] == run["last"] else f"{run['first']} - {run['last']}"
+        text = run["text"]
+        if (
+            history["kind"] == "control"
+            and previous_run is not None
+            and previous_run["text"] == text
+            and previous_run["hash"] != run["hash"]
+        ):
+            # Control variants only carry the title
+            text += " (statements changed)"
+        lines.append(f"  {version_range}: {text}")
+        previous_run = run
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        prog="oscal_common_cp.change_history",
+        description="Index when each control and statement changed across catalog versions, "
+        "and look up their history.",
+    )
+    arg_parser.add_argument(
+        "--catalog-dir",
+        dest="catalog_dir",
+        type=Path,
+        help="Directory of catalogs to index (default: ./oscal-json)",
+        default=Path.joinpath(Path.cwd(), "oscal-json"),
+    )
+    arg_parser.add_argument(
+        "--index",
+        dest="index_path",
+        type=Path,
+        help="Where the index is kept (default: a file per catalog directory under "
+        "$XDG_CACHE_HOME/oscal-common-cp/change-history)",
+        default=None,
+    )
+    arg_parser.add_argument(
+        "--rebuild",
+        dest="rebuild",
+        action="store_true",
+        help="Index every version from scratch, rather than only new ones",
+    )
+    arg_parser.add_argument(
+        "--json",
+        dest="json_output",
+        action="store_true",
+        help="Print the histories as JSON",
+    )
+    arg_parser.add_argument(
+        "ids",
+        nargs="*",
+        help="Control or statement IDs to show the history of, e.g. ctrl-5.9.0-circumstances-for-revocation",
+    )
+
+    args = arg_parser.parse_args()
+    index_path = (
+        args.index_path
+        if args.index_path is not None
+        else default_index_path(args.catalog_dir)
+    )
+
+    change_history = ChangeHistory() if args.rebuild else ChangeHistory.load(index_path)
+    indexed_versions = change_history.update(args.catalog_dir)
+    if len(indexed_versions) > 0:
+        change_history.save(index_path)
+        print(f"Indexed {', '.join(indexed_versions)} into {index_path}", file=sys.stderr)
+
+    histories = []
+    for item_id in args.ids:
+        history = change_history.history(item_id)
+        if history is None:
+            print(f"{item_id} is not in any indexed version", file=sys.stderr)
+            continue
+        histories.append(history)
+
+    if args.json_output:
+        print(json.dumps(histories, indent=4))
+    else:
+        for history in histories:
+            print(format_history(history))
+    if len(histories) < len(args.ids):
+        exit(1)
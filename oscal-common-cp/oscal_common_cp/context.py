@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from contextlib import AbstractContextManager, nullcontext
+import uuid
+
+from .oscal_models import common
+from .stats import ConversionStats
+from .table_parser import TableParser
+
+# Namespace for the name-based UUIDs generated when deterministic_uuids is set
+UUID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://github.com/Credentive-Sec/OSCAL-Common-CP")
+
+
+class ConversionContext:
+    # Holds everything that changes while a single policy is converted. A new context is
+    # created for each call to common_policy_to_catalog, so one SimpleOscalParser can convert
+    # many documents back-to-back, or several at once from different threads.
+
+    def __init__(
+        self,
+        deterministic_uuids: bool = False,
+        trusted: bool = False,
+        stats: ConversionStats | None = None,
+    ) -> None:
+        # When set, UUIDs are derived from stable keys (titles, versions, URLs), so converting
+        # the same input twice gives byte-identical output. Otherwise they are random.
+        self.deterministic_uuids = deterministic_uuids
+        # Number of times each UUID key has been used, to keep repeated keys unique
+        self.uuid_keys: dict[str, int] = {}
+
+        # When set, groups, controls and parts are built without pydantic validation
+        self.trusted = trusted
+
+        # Current position in the TOC, one counter per header depth.
+        # Stupid python trick, initialize with zero using list comprehension
+        self.toc_pos: list[int] = [0 for _ in range(1, 10)]
+        self.toc_pos[0] = 1
+
+        # Section name -> section number, as listed in the TOC
+        self.toc_dict: dict[str, str] = {}
+
+        # Every group/control ID handed out during the conversion, and how many times
+        self.id_registry: dict[str, int] = {}
+
+        # Table parsers keep state while parsing, so each conversion gets its own
+        self.table_parser = TableParser()
+
+        # Set once the references section has been converted
+        self.backmatter: common.BackMatter | None = None
+
+        # Timings and counters, only collected when the caller asks for them
+        self.stats = stats
+
+
+    def section_number(self, section_depth: int) -> str:
+        # e.g. "4.2.1" for a section at depth 3
+        return ".".join([str(x) for x in self.toc_pos][:section_depth])
+
+
+    def advance_toc(self, section_depth: int) -> None:
+        # Move to the next section at this depth and reset the counters below it
+        self.toc_pos[section_depth - 1] += 1
+        self.toc_pos[section_depth:] = [0 for _ in range(0, 9 - section_depth)]
+
+
+    def timer(self, stage: str) -> AbstractContextManager[None]:
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.timer(stage)
+
+
+    def count(self, name: str, amount: int = 1) -> None:
+        if self.stats is not None:
+            self.stats.count(name, amount)
+
+
+    def register_id(self, oscal_id: str) -> str:
+        # Section titles are not unique, so the same ID can be generated more than once.
+        # Each ID that does is counted once in the stats as a duplicate_ids.
+        self.id_registry[oscal_id] = self.id_registry.get(oscal_id, 0) + 1
+        if self.id_registry[oscal_id] == 2:
+            self.count("duplicate_ids")
+        return oscal_id
+
+
+    def make_uuid(self, *key_parts: str) -> uuid.UUID:
+        if not self.deterministic_uuids:
+            return uuid.uuid4()
+
+        uuid_key = "\x1f".join(key_parts)
+        self.uuid_keys[uuid_key] = self.uuid_keys.get(uuid_key, 0) + 1
+        if self.uuid_keys[uuid_key] > 1:
+            # e.g. the same reference listed twice - it still needs its own UUID
+            uuid_key = f"{uuid_key}\x1f{self.uuid_keys[uuid_key]}"
+        return uuid.uuid5(UUID_NAMESPACE, uuid_key)
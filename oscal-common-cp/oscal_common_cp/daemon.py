@@ -0,0 +1,326 @@
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+
+from .batch import ConversionOptions
+from .catalog_writer import (
+    catalog_filename,
+    catalog_output_path,
+    serialize_catalog,
+    write_catalog_json,
+)
+from .section_memo import SERVICE_MAX_SECTIONS
+from .simple_oscal_parser import SimpleOscalParser, validate_catalog
+from .synthetic_policy import SyntheticPolicy
+
+# Requests and responses are a line of JSON, optionally followed by a body of exactly
+# "content_length" bytes: the policy markdown in a request, the catalog JSON in a response.
+#
+#   {"command": "convert", "path": "/abs/path/to/policy.md", "options": {...}}
+#   {"command": "convert", "content_length": 1234, "options": {...}}  + 1234 bytes of markdown
+#   {"command": "ping"} / {"command": "shutdown"}
+#
+#   {"ok": true, "filename": "X.509 ... .json", "content_length": 5678}  + 5678 bytes of JSON
+#   {"ok": false, "error": "ValueError: ..."}
+#
+# A connection can carry any number of requests, one after the other.
+
+# Options a client may set, passed through to ConversionOptions
+REQUEST_OPTIONS = ["parser_type", "deterministic_uuids", "serializer", "pretty", "trusted", "validate"]
+
+
+def default_socket_path() -> Path:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir, "oscal-common-cp.sock")
+    # The temporary directory is shared with every other user, so the socket goes in a
+    # directory of our own that the daemon creates with mode 0700
+    return Path(tempfile.gettempdir(), f"oscal-common-cp-{os.getuid()}", "daemon.sock")
+
+
+def read_message(message_file: BinaryIO) -> tuple[dict[str, Any], bytes] | None:
+    header_line = message_file.readline()
+    if not header_line:
+        # The other end closed the connection
+        return None
+    header = json.loads(header_line)
+    if not isinstance(header, dict):
+        raise ValueError("The message header is not a JSON object")
+    body = b""
+    if "content_length" in header:
+        content_length = header["content_length"]
+        if not isinstance(content_length, int) or content_length < 0:
+            raise ValueError(f"Invalid content_length {content_length!r}")
+        body = message_file.read(content_length)
+        if len(body) != content_length:
+            raise ConnectionError("Connection closed in the middle of a message")
+    return header, body
+
+
+def write_message(message_file: BinaryIO, header: dict[str, Any], body: bytes = b"") -> None:
+    if len(body) > 0:
+        header = dict(header, content_length=len(body))
+    message_file.write(json.dumps(header).encode() + b"\n" + body)
+    message_file.flush()
+
+
+class ConversionRequestHandler(socketserver.StreamRequestHandler):
+    server: "ConversionDaemon"
+
+    def handle(self) -> None:
+        while True:
+            try:
+                message = read_message(self.rfile)
+            except (ValueError, ConnectionError) as e:
+                write_message(self.wfile, {"ok": False, "error": f"{type(e).__name__}: {e}"})
+                return
+            if message is None:
+                return
+
+            request, content = message
+            command = request.get("command", "convert")
+            if command == "ping":
+                write_message(self.wfile, {"ok": True})
+            elif command == "shutdown":
+                write_message(self.wfile, {"ok": True})
+                # shutdown() waits for serve_forever to return, so it can't run on this thread
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            elif command == "convert":
+                try:
+                    catalog_name, catalog_json = self.server.convert(request, content)
+                except Exception as e:
+                    # Report the failure to the client and keep serving
+                    write_message(self.wfile, {"ok": False, "error": f"{type(e).__name__}: {e}"})
+                else:
+                    write_message(
+                        self.wfile, {"ok": True, "filename": catalog_name}, catalog_json.encode()
+                    )
+            else:
+                write_message(self.wfile, {"ok": False, "error": f"Unknown command {command}"})
+
+
+class ConversionDaemon(socketserver.ThreadingUnixStreamServer):
+    # A long-running converter listening on a Unix socket. The interpreter, the
+    # oscal_pydantic models and the parser (with its section memo) are set up once and then
+    # shared by every request, so each conversion only pays for the conversion itself.
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path) -> None:
+        self.socket_path = socket_path
+        self.parser = SimpleOscalParser(max_memo_sections=SERVICE_MAX_SECTIONS)
+
+        if socket_path.exists():
+            # Left behind by a daemon that didn't shut down cleanly - unless one is still running
+            if DaemonClient(socket_path).is_running():
+                raise RuntimeError(f"A daemon is already listening on {socket_path}")
+            socket_path.unlink()
+        # Directories we create are only open to us
+        socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        # Only the user running the daemon may connect. The socket is created with these
+        # permissions rather than changed afterwards, which would leave a window where it is
+        # open to anyone the umask allows.
+        previous_umask = os.umask(0o177)
+        try:
+            super().__init__(str(socket_path), ConversionRequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+
+    def warm_up(self) -> None:
+        # Convert a small generated policy, so the models are imported and every code path
+        # has run once before the first real request comes in
+        self.convert_lines(SyntheticPolicy(sections=20).lines(), ConversionOptions())
+        # The synthetic sections shouldn't take up room in the memo
+        if self.parser.section_memo is not None:
+            self.parser.section_memo.clear()
+
+
+    def convert(self, request: dict[str, Any], content: bytes) -> tuple[str, str]:
+        request_options = request.get("options", {})
+        options = ConversionOptions(
+            **{name: request_options[name] for name in REQUEST_OPTIONS if name in request_options}
+        )
+        if "path" in request:
+            with open(request["path"]) as common_file:
+                return self.convert_lines(common_file, options)
+        elif "content_length" in request:
+            return self.convert_lines(content.decode().splitlines(), options)
+        else:
+            raise ValueError("A convert request needs a path or content")
+
+
+    def convert_lines(
+        self, common_policy: Iterable[str], options: ConversionOptions
+    ) -> tuple[str, str]:
+        common_catalog = self.parser.common_policy_to_catalog(
+            common_policy,
+            deterministic_uuids=options.deterministic_uuids,
+            trusted=options.trusted,
+        )
+        if options.validate:
+            validate_catalog(common_catalog)
+        return (
+            catalog_filename(common_catalog, options.parser_type),
+            serialize_catalog(common_catalog, options.serializer, options.pretty),
+        )
+
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+
+class DaemonClient:
+    # Talks to a ConversionDaemon. Each call opens its own connection.
+
+    def __init__(self, socket_path: Path | None = None, timeout: float | None = None) -> None:
+        self.socket_path = socket_path if socket_path is not None else default_socket_path()
+        self.timeout = timeout
+
+
+    def request(self, header: dict[str, Any], body: bytes = b"") -> tuple[dict[str, Any], bytes]:
+        # Anyone can create a socket where ours is expected, e.g. in a shared temporary
+        # directory. Only talk to one that another of our own processes created.
+        if self.socket_path.stat().st_uid != os.getuid():
+            raise PermissionError(f"{self.socket_path} is owned by another user")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+            client_socket.settimeout(self.timeout)
+            client_socket.connect(str(self.socket_path))
+            with client_socket.makefile("rwb") as socket_file:
+                write_message(socket_file, header, body)
+                response = read_message(socket_file)
+        if response is None:
+            raise ConnectionError("The daemon closed the connection without responding")
+        return response
+
+
+    def is_running(self) -> bool:
+        try:
+            response, _ = self.request({"command": "ping"})
+        except OSError:
+            return False
+        return response.get("ok", False)
+
+
+    def shutdown(self) -> None:
+        self.request({"command": "shutdown"})
+
+
+    def convert(
+        self,
+        path: Path | None = None,
+        content: str | None = None,
+        **options: Any,
+    ) -> tuple[str, str]:
+        # Returns the catalog's file name and JSON. Paths are sent as absolute paths, since
+        # the daemon doesn't share our working directory.
+        request: dict[str, Any] = {"command": "convert", "options": options}
+        body = b""
+        if path is not None:
+            request["path"] = str(Path(path).resolve())
+        elif content is not None:
+            body = content.encode()
+        else:
+            raise ValueError("Provide a path or content to convert")
+
+        response, catalog_json = self.request(request, body)
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response["filename"], catalog_json.decode()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        prog="oscal_common_cp.daemon",
+        description="Run a long-lived conversion daemon on a Unix socket, or talk to one.",
+    )
+    arg_parser.add_argument(
+        "--socket",
+        dest="socket_path",
+        type=Path,
+        help=f"Path of the Unix socket (default: {default_socket_path()})",
+        default=None,
+    )
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("serve", help="Start the daemon in the foreground")
+    subcommands.add_parser("stop", help="Ask a running daemon to shut down")
+    subcommands.add_parser("ping", help="Check whether a daemon is running")
+    convert_parser = subcommands.add_parser(
+        "convert", help="Convert a policy with the daemon and write the catalog to oscal-json"
+    )
+    convert_parser.add_argument("filename", type=Path, help="The policy to convert")
+    convert_parser.add_argument(
+        "--deterministic-uuids",
+        dest="deterministic_uuids",
+        action="store_true",
+        help="Derive UUIDs from titles, versions and URLs so unchanged input gives identical output",
+    )
+    convert_parser.add_argument(
+        "--compact",
+        dest="pretty",
+        action="store_false",
+        help="Write the catalog without indentation",
+    )
+    convert_parser.add_argument(
+        "--trusted",
+        dest="trusted",
+        action="store_true",
+        help="Build groups, controls and parts without pydantic validation (faster, same output)",
+    )
+    convert_parser.add_argument(
+        "--stdout",
+        dest="stdout",
+        action="store_true",
+        help="Write the catalog to stdout instead of oscal-json",
+    )
+
+    args = arg_parser.parse_args()
+    socket_path = args.socket_path if args.socket_path is not None else default_socket_path()
+
+    if args.command == "serve":
+        with ConversionDaemon(socket_path) as daemon:
+            daemon.warm_up()
+            print(f"Listening on {socket_path}", file=sys.stderr)
+            try:
+                daemon.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    elif args.command == "stop":
+        DaemonClient(socket_path).shutdown()
+    elif args.command == "ping":
+        if not DaemonClient(socket_path).is_running():
+            print(f"No daemon is listening on {socket_path}")
+            exit(1)
+        print(f"A daemon is listening on {socket_path}")
+    elif args.command == "convert":
+        try:
+            catalog_name, catalog_json = DaemonClient(socket_path).convert(
+                path=args.filename,
+                deterministic_uuids=args.deterministic_uuids,
+                pretty=args.pretty,
+                trusted=args.trusted,
+            )
+        except (OSError, RuntimeError) as e:
+            print(f"Could not convert {args.filename}: {e}", file=sys.stderr)
+            exit(1)
+        if args.stdout:
+            sys.stdout.write(catalog_json)
+        else:
+            try:
+                output_path = catalog_output_path(
+                    Path.joinpath(Path.cwd(), "oscal-json"), catalog_name
+                )
+            except ValueError as e:
+                print(f"Could not convert {args.filename}: {e}", file=sys.stderr)
+                exit(1)
+            write_catalog_json(catalog_json, output_path)
+            print(f"Wrote {output_path}")
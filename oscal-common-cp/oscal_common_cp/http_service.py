@@ -0,0 +1,382 @@
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+import argparse
+import asyncio
+import json
+
+from .batch import ConversionOptions
+from .catalog_writer import (
+    catalog_filename,
+    catalog_output_path,
+    find_catalogs,
+    serialize_catalog,
+    write_catalog_json,
+)
+from .oscal_models import document
+from .section_memo import SERVICE_MAX_SECTIONS
+from .simple_oscal_parser import SimpleOscalParser, validate_catalog
+
+# A small HTTP/1.1 service for converting policies without shelling out to the CLI:
+#
+#   POST /convert         body: tokenized policy markdown -> catalog JSON
+#                         query: deterministic_uuids, trusted, validate, compact, save
+#   POST /validate        body: catalog JSON -> {"valid": true} or 422 with the error
+#   GET  /catalogs        versions available in the catalog directory
+#   GET  /catalogs/<ver>  the catalog for a policy version, e.g. /catalogs/2.6
+#   GET  /health          concurrency and queue counters
+#
+# X-Catalog-Filename carries the catalog's file name. Names that aren't Latin-1 are sent
+# RFC 5987 style, as UTF-8'' followed by the percent-encoded UTF-8 name.
+#
+# Conversions run in a process pool so the event loop only ever handles I/O. At most
+# max_concurrency run at once, and up to max_queue more wait for a slot. Beyond that,
+# requests are turned away with 503 until the queue drains.
+
+# Each worker process builds its parser once and reuses it for every request it is given
+_parser: SimpleOscalParser | None = None
+
+
+def convert_policy_text(policy_text: str, options: ConversionOptions) -> tuple[str, str]:
+    global _parser
+    if _parser is None:
+        _parser = SimpleOscalParser(max_memo_sections=SERVICE_MAX_SECTIONS)
+
+    common_catalog = _parser.common_policy_to_catalog(
+        policy_text.splitlines(),
+        deterministic_uuids=options.deterministic_uuids,
+        trusted=options.trusted,
+    )
+    if options.validate:
+        validate_catalog(common_catalog)
+    return (
+        catalog_filename(common_catalog, options.parser_type),
+        serialize_catalog(common_catalog, options.serializer, options.pretty),
+    )
+
+
+def validate_catalog_text(catalog_text: str) -> str | None:
+    # Returns the validation error, or None if the catalog is valid
+    try:
+        document.Document.model_validate_json(catalog_text)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def header_value(value: str) -> str:
+    # Header values go out as Latin-1, so anything else is percent-encoded UTF-8
+    try:
+        value.encode("latin-1")
+    except UnicodeEncodeError:
+        return "UTF-8''" + quote(value, safe="")
+    return value
+
+
+class HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class ConversionService:
+    def __init__(
+        self,
+        catalog_dir: Path,
+        workers: int | None = None,
+        max_concurrency: int = 4,
+        max_queue: int = 16,
+        max_body_bytes: int = 16 * 1024 * 1024,
+    ) -> None:
+        # Catalogs served by /catalogs, and where /convert?save=true writes them
+        self.catalog_dir = catalog_dir
+        # No point in more workers than conversions allowed to run at once
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers if workers is not None else max_concurrency
+        )
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_body_bytes = max_body_bytes
+        self.running = 0
+        self.waiting = 0
+        # Created on the event loop, in serve()
+        self.slots: asyncio.Semaphore | None = None
+
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+
+    async def run_in_pool(self, function, *args: Any) -> Any:
+        # Backpressure: once every slot is busy and the queue is full, refuse new work
+        # rather than letting requests pile up in memory
+        if self.slots is None:
+            raise RuntimeError("The service is not running")
+        if self.running >= self.max_concurrency and self.waiting >= self.max_queue:
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many conversions in progress")
+
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        finally:
+            self.running -= 1
+            self.slots.release()
+
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # One request per connection
+        try:
+            try:
+                method, path, query, body = await self.read_request(reader)
+                status, content_type, response_body, headers = await self.route(
+                    method, path, query, body
+                )
+            except HttpError as e:
+                status, content_type, response_body, headers = (
+                    e.status,
+                    "application/json",
+                    json.dumps({"error": str(e)}).encode(),
+                    {"Retry-After": "1"} if e.status == HTTPStatus.SERVICE_UNAVAILABLE else {},
+                )
+            except Exception as e:
+                status, content_type, response_body, headers = (
+                    HTTPStatus.INTERNAL_SERVER_ERROR,
+                    "application/json",
+                    json.dumps({"error": f"{type(e).__name__}: {e}"}).encode(),
+                    {},
+                )
+            try:
+                await self.write_response(writer, status, content_type, response_body, headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as e:
+                # Nothing has been sent yet, since the head is encoded before it is written
+                await self.write_response(
+                    writer,
+                    HTTPStatus.INTERNAL_SERVER_ERROR,
+                    "application/json",
+                    json.dumps({"error": f"{type(e).__name__}: {e}"}).encode(),
+                    {},
+                )
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # The client went away
+            pass
+        finally:
+            writer.close()
+
+
+    async def read_request(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[str, str, dict[str, list[str]], bytes]:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+        headers: dict[str, str] = {}
+        while True:
+            header_line = (await reader.readline()).decode("latin-1").strip()
+            if header_line == "":
+                break
+            name, _, value = header_line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        body = b""
+        if method == "POST":
+            if "content-length" not in headers:
+                raise HttpError(HTTPStatus.LENGTH_REQUIRED, "Content-Length is required")
+            content_length_value = headers["content-length"]
+            if not content_length_value.isdecimal():
+                raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length must be a number of bytes")
+            content_length = int(content_length_value)
+            if content_length > self.max_body_bytes:
+                raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body is too large")
+            body = await reader.readexactly(content_length)
+
+        url = urlsplit(target)
+        return method, unquote(url.path), parse_qs(url.query), body
+
+
+    async def write_response(
+        self,
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        content_type: str,
+        body: bytes,
+        headers: dict[str, str],
+    ) -> None:
+        head_lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Connection: close",
+        ] + [f"{name}: {header_value(value)}" for name, value in headers.items()]
+        writer.write(("\r\n".join(head_lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+    async def route(
+        self, method: str, path: str, query: dict[str, list[str]], body: bytes
+    ) -> tuple[HTTPStatus, str, bytes, dict[str, str]]:
+        if path == "/convert" and method == "POST":
+            return await self.convert(query, body)
+        elif path == "/validate" and method == "POST":
+            return await self.validate(body)
+        elif path == "/catalogs" and method == "GET":
+            return self.json_response({"versions": list(find_catalogs(self.catalog_dir))})
+        elif path.startswith("/catalogs/") and method == "GET":
+            return self.fetch_catalog(path[len("/catalogs/"):])
+        elif path == "/health" and method == "GET":
+            return self.json_response(
+                {
+                    "running": self.running,
+                    "waiting": self.waiting,
+                    "max_concurrency": self.max_concurrency,
+                    "max_queue": self.max_queue,
+                }
+            )
+        raise HttpError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+
+
+    def json_response(
+        self, content: Any, status: HTTPStatus = HTTPStatus.OK
+    ) -> tuple[HTTPStatus, str, bytes, dict[str, str]]:
+        return status, "application/json", json.dumps(content).encode(), {}
+
+
+    async def convert(
+        self, query: dict[str, list[str]], body: bytes
+    ) -> tuple[HTTPStatus, str, bytes, dict[str, str]]:
+        def flag(name: str) -> bool:
+            return query.get(name, ["false"])[-1].lower() in ("1", "true", "yes")
+
+        options = ConversionOptions(
+            deterministic_uuids=flag("deterministic_uuids"),
+            trusted=flag("trusted"),
+            validate=flag("validate"),
+            pretty=not flag("compact"),
+        )
+        try:
+            catalog_name, catalog_json = await self.run_in_pool(
+                convert_policy_text, self.body_text(body), options
+            )
+        except (ValueError, KeyError, IndexError) as e:
+            # The policy isn't in the tokenized format the parser expects
+            raise HttpError(HTTPStatus.UNPROCESSABLE_ENTITY, f"{type(e).__name__}: {e}")
+
+        if flag("save"):
+            try:
+                output_path = catalog_output_path(self.catalog_dir, catalog_name)
+            except ValueError as e:
+                raise HttpError(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+            write_catalog_json(catalog_json, output_path)
+        return HTTPStatus.OK, "application/json", catalog_json.encode(), {
+            "X-Catalog-Filename": catalog_name
+        }
+
+
+    async def validate(self, body: bytes) -> tuple[HTTPStatus, str, bytes, dict[str, str]]:
+        validation_error = await self.run_in_pool(validate_catalog_text, self.body_text(body))
+        if validation_error is not None:
+            return self.json_response(
+                {"valid": False, "error": validation_error}, HTTPStatus.UNPROCESSABLE_ENTITY
+            )
+        return self.json_response({"valid": True})
+
+
+    def body_text(self, body: bytes) -> str:
+        try:
+            return body.decode()
+        except UnicodeDecodeError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "The request body must be UTF-8 text")
+
+
+    def fetch_catalog(self, version: str) -> tuple[HTTPStatus, str, bytes, dict[str, str]]:
+        catalog_path = find_catalogs(self.catalog_dir).get(version)
+        if catalog_path is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"No catalog for version {version}")
+        return HTTPStatus.OK, "application/json", catalog_path.read_bytes(), {
+            "X-Catalog-Filename": catalog_path.name
+        }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        prog="oscal_common_cp.http_service",
+        description="Serve policy conversions over HTTP on this machine.",
+    )
+    arg_parser.add_argument(
+        "--host",
+        dest="host",
+        help="Address to listen on (default: 127.0.0.1, i.e. local connections only)",
+        default="127.0.0.1",
+    )
+    arg_parser.add_argument(
+        "--port",
+        dest="port",
+        type=int,
+        help="Port to listen on (default: 8765)",
+        default=8765,
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        help="Number of worker processes (default: --max-concurrency)",
+        default=None,
+    )
+    arg_parser.add_argument(
+        "--max-concurrency",
+        dest="max_concurrency",
+        type=int,
+        help="Conversions and validations allowed to run at once (default: 4)",
+        default=4,
+    )
+    arg_parser.add_argument(
+        "--max-queue",
+        dest="max_queue",
+        type=int,
+        help="Requests allowed to wait for a free slot before new ones get 503 (default: 16)",
+        default=16,
+    )
+    arg_parser.add_argument(
+        "--catalog-dir",
+        dest="catalog_dir",
+        type=Path,
+        help="Directory of catalogs served by /catalogs (default: ./oscal-json)",
+        default=Path.joinpath(Path.cwd(), "oscal-json"),
+    )
+
+    args = arg_parser.parse_args()
+
+    service = ConversionService(
+        catalog_dir=args.catalog_dir,
+        workers=args.jobs,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+    )
+    print(f"Listening on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
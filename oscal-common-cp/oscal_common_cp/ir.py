@@ -0,0 +1,59 @@
+# A lightweight intermediate representation of a tokenized policy.
+#
+# The scanning stage of SimpleOscalParser turns lines of markdown into these records, and the
+# building stage turns the records into oscal_pydantic models. The records are small, frozen
+# and hashable, so they can be cached, compared, pickled and sent between processes without
+# building any of the (much heavier) OSCAL objects. Consumers that only need the text of the
+# policy can stop after the scanning stage.
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Paragraph:
+    # A line of prose, with any html already stripped out
+    text: str
+
+
+@dataclass(frozen=True, slots=True)
+class Table:
+    # The cells of an html table, row by row
+    rows: tuple[tuple[str, ...], ...]
+
+
+@dataclass(frozen=True, slots=True)
+class Section:
+    # One "#" section of the policy. number is the position in the TOC, e.g. "4.2.1"
+    # blocks is None when the section is only a title, and has no control.
+    number: str
+    depth: int
+    title: str
+    blocks: tuple[Paragraph | Table, ...] | None
+
+
+@dataclass(frozen=True, slots=True)
+class Revision:
+    # A row of the revision history table. published is an ISO 8601 timestamp.
+    version: str
+    published: str
+    remarks: str
+
+
+@dataclass(frozen=True, slots=True)
+class Reference:
+    # A document listed in the References appendix
+    title: str
+    description: str
+    url: str
+
+
+@dataclass(frozen=True, slots=True)
+class References:
+    references: tuple[Reference, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class Introduction:
+    # The title page of the policy. revisions is None when there is no revision history table.
+    version: str
+    published: str
+    revisions: tuple[Revision, ...] | None
@@ -0,0 +1,218 @@
+from pathlib import Path
+from typing import Callable, TypeVar
+import ast
+import cProfile
+import io
+import os
+import pstats
+import tracemalloc
+
+from .batch import ConversionOptions
+from .catalog_writer import catalog_filename, catalog_output_path, write_catalog
+from .oscal_models import import_models
+from .simple_oscal_parser import SimpleOscalParser, validate_catalog
+
+T = TypeVar("T")
+
+# Source files of this package. Allocations are attributed to the functions in these files,
+# e.g. build_control or parse_html_table, rather than to the pydantic internals they call.
+PACKAGE_DIR = Path(__file__).resolve().parent
+
+
+def package_functions() -> dict[str, list[tuple[int, int, str]]]:
+    # File -> (first line, last line, qualified name) of every function in the package
+    functions: dict[str, list[tuple[int, int, str]]] = {}
+    for source_path in sorted(PACKAGE_DIR.glob("*.py")):
+        module_name = source_path.stem
+        file_functions: list[tuple[int, int, str]] = []
+
+        def visit(node: ast.AST, prefix: str) -> None:
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    qualified_name = f"{prefix}.{child.name}"
+                    file_functions.append(
+                        (child.lineno, child.end_lineno or child.lineno, qualified_name)
+                    )
+                    visit(child, qualified_name)
+                elif isinstance(child, ast.ClassDef):
+                    visit(child, f"{prefix}.{child.name}")
+
+        visit(ast.parse(source_path.read_text()), module_name)
+        # Innermost function first, so nested functions win over the ones around them
+        file_functions.sort(key=lambda function: function[0], reverse=True)
+        functions[str(source_path)] = file_functions
+    return functions
+
+
+class AllocationReport:
+    # Sums up a tracemalloc snapshot by the package function that made each allocation.
+    # A snapshot only holds memory that is still allocated when it is taken, so take it
+    # while the catalog is still alive. peak_size is the most memory traced at any point.
+    #
+    # "own" credits each allocation to the innermost package function on its stack, "total"
+    # credits it to every package function on the stack, so e.g. sections_to_groups includes
+    # everything allocated by the build_group calls it makes.
+
+    def __init__(self, snapshot: tracemalloc.Snapshot, peak_size: int = 0) -> None:
+        self.snapshot = snapshot
+        self.peak_size = peak_size
+        self.functions = package_functions()
+        self.real_paths: dict[str, str] = {}
+        self.own: dict[str, list[int]] = {}
+        self.total: dict[str, list[int]] = {}
+
+        for trace in snapshot.traces:
+            stack_functions: list[str] = []
+            # Frames are ordered from the oldest call to the most recent
+            for frame in trace.traceback:
+                function_name = self.function_at(frame.filename, frame.lineno)
+                if function_name is not None and function_name not in stack_functions:
+                    stack_functions.append(function_name)
+            if len(stack_functions) == 0:
+                continue
+            self.add(self.own, stack_functions[-1], trace.size)
+            for function_name in stack_functions:
+                self.add(self.total, function_name, trace.size)
+
+
+    def add(self, allocations: dict[str, list[int]], function_name: str, size: int) -> None:
+        function_allocations = allocations.setdefault(function_name, [0, 0])
+        function_allocations[0] += size
+        function_allocations[1] += 1
+
+
+    def function_at(self, filename: str, lineno: int) -> str | None:
+        real_path = self.real_paths.get(filename)
+        if real_path is None:
+            real_path = os.path.realpath(filename)
+            self.real_paths[filename] = real_path
+        for first_line, last_line, function_name in self.functions.get(real_path, []):
+            if first_line <= lineno <= last_line:
+                return function_name
+        return None
+
+
+    def snapshot_size(self) -> int:
+        return sum(trace.size for trace in self.snapshot.traces)
+
+
+    def format(self, top: int = 25) -> str:
+        lines: list[str] = [
+            f"Peak traced memory: {format_size(self.peak_size)}",
+            f"Traced memory at snapshot: {format_size(self.snapshot_size())}",
+            "",
+        ]
+        for title, allocations in (
+            ("Allocations by package function (own)", self.own),
+            ("Allocations by package function (total, including callees)", self.total),
+        ):
+            lines.append(title)
+            lines.append(f"{'size':>12} {'blocks':>10}  function")
+            ranked = sorted(allocations.items(), key=lambda item: item[1][0], reverse=True)
+            for function_name, (size, count) in ranked[:top]:
+                lines.append(f"{format_size(size):>12} {count:>10}  {function_name}")
+            lines.append("")
+
+        lines.append("Allocations by line")
+        for statistic in self.snapshot.statistics("lineno")[:top]:
+            frame = statistic.traceback[0]
+            lines.append(
+                f"{format_size(statistic.size):>12} {statistic.count:>10}  "
+                f"{frame.filename}:{frame.lineno}"
+            )
+        lines.append("")
+        return "\n".join(lines)
+
+
+def format_size(size: int) -> str:
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} MiB"
+    elif size >= 1024:
+        return f"{size / 1024:.1f} KiB"
+    return f"{size} B"
+
+
+def profile_report_paths(profile_path: Path) -> tuple[Path, Path]:
+    # The summary and allocation reports written next to the cProfile data. The suffixes are
+    # appended rather than swapped in, so e.g. "run.txt" doesn't get its summary written
+    # over it.
+    return (
+        profile_path.with_name(profile_path.name + ".txt"),
+        profile_path.with_name(profile_path.name + ".allocations.txt"),
+    )
+
+
+def profile_call(
+    function: Callable[[], T],
+    profile_path: Path,
+    top: int = 25,
+    traceback_frames: int = 25,
+) -> T:
+    # Run function under cProfile and tracemalloc. Writes the cProfile data to profile_path
+    # (for pstats, snakeviz, etc.), and a summary of both and the allocation report to the
+    # profile_report_paths().
+    #
+    # Stacks have to be deep enough to reach from pydantic's internals back to the parser,
+    # but every extra frame slows the conversion down further.
+    tracemalloc.start(traceback_frames)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            result = function()
+        finally:
+            profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak_size = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Leave out tracemalloc's own bookkeeping
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    profile_path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(profile_path)
+
+    summary = io.StringIO()
+    profile_stats = pstats.Stats(profiler, stream=summary)
+    profile_stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    summary_path, allocations_path = profile_report_paths(profile_path)
+    summary_path.write_text(summary.getvalue())
+
+    allocation_report = AllocationReport(snapshot, peak_size)
+    allocations_path.write_text(allocation_report.format(top))
+
+    return result
+
+
+def profile_conversion(
+    input_path: Path,
+    output_dir: Path,
+    options: ConversionOptions,
+    profile_path: Path,
+    top: int = 25,
+) -> Path:
+    # Convert a single policy in this process under profile_call. The conversion returns the
+    # catalog so it is still in memory when the allocation snapshot is taken.
+    def convert():
+        # No memo or cache, so every section is actually built
+        oscal_parser = SimpleOscalParser(memoize_sections=False)
+        with open(input_path) as common_file:
+            common_catalog = oscal_parser.common_policy_to_catalog(
+                common_file,
+                deterministic_uuids=options.deterministic_uuids,
+                trusted=options.trusted,
+            )
+        if options.validate:
+            validate_catalog(common_catalog)
+        output_path = write_catalog(
+            common_catalog,
+            catalog_output_path(output_dir, catalog_filename(common_catalog, options.parser_type)),
+            options.serializer,
+            options.pretty,
+        )
+        return common_catalog, output_path
+
+    import_models()
+    _, output_path = profile_call(convert, profile_path, top)
+    return output_path
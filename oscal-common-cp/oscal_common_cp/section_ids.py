@@ -0,0 +1,43 @@
+import re
+
+# Header markers and html tags are removed from section titles and prose
+header_hashes_re = re.compile(r"#+")
+html_tag_re = re.compile("<.*>")
+
+# Turns "Section Name (Optional)" into "section-name-optional" in one pass: spaces become
+# dashes and the characters that aren't allowed in an ID are dropped.
+title_id_table = str.maketrans({" ": "-", **{c: None for c in "(),/’:"}})
+
+
+def strip_html(text: str) -> str:
+    return html_tag_re.sub("", text)
+
+
+def title_to_id(title: str) -> str:
+    return title.lower().strip().translate(title_id_table)
+
+
+def header_title(header_line: str) -> str:
+    # Strip off the leading hashes and the surrounding spaces, then any html
+    return strip_html(header_hashes_re.sub("", header_line).strip())
+
+
+class SectionIds:
+    # Every ID derived from a section's number and title, worked out once per section so that
+    # building the group, control and each statement part doesn't redo the string handling.
+
+    def __init__(self, section_number: str, section_title: str) -> None:
+        self.title = section_title
+        title_id = title_to_id(section_title)
+
+        # e.g. group-4.2.1-section-name, with its controls in control-4.2.1-section-name
+        self.group_id = f"group-{section_number}-{title_id}"
+        self.control_group_id = self.group_id.replace("group", "control")
+
+        # e.g. ctrl-4.2.1-section-name, with statement parts stmt-4.2.1-section-name-1, -2, ...
+        self.control_id = f"ctrl-{section_number}-{title_id}"
+        self.statement_prefix = self.control_id.replace("ctrl", "stmt") + "-"
+
+
+    def statement_id(self, part_number: int) -> str:
+        return self.statement_prefix + str(part_number)
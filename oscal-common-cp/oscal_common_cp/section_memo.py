@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import threading
+
+from . import ir
+from .oscal_models import catalog
+
+# Long-running services share one parser between every request they serve, so their memo
+# only keeps a few revisions' worth of sections (each revision has about 300 with controls)
+SERVICE_MAX_SECTIONS = 1000
+
+
+class SectionMemo:
+    # Remembers the control group built for each section, keyed by the scanned section itself
+    # (its number, title and contents). When a new revision of the policy only changes a few
+    # sections, everything else is reused from earlier conversions instead of being rebuilt.
+    #
+    # The memoized groups are shared between every document they end up in, so they must
+    # not be modified after they are built. Only groups built with validation are kept, so a
+    # trusted conversion never hands its unvalidated models to a later validated one. Only
+    # the most recent max_sections are kept.
+    #
+    # Sections are still scanned (including their tables) to look them up, so a hit only
+    # saves building the models.
+
+    def __init__(self, max_sections: int = 20000) -> None:
+        self.max_sections = max_sections
+        self.hits = 0
+        self.misses = 0
+        self.control_groups: OrderedDict[ir.Section, catalog.Group] = OrderedDict()
+        # Conversions running in different threads can share a parser, and its memo
+        self.lock = threading.Lock()
+
+
+    def get(self, section: ir.Section) -> catalog.Group | None:
+        with self.lock:
+            control_group = self.control_groups.get(section)
+            if control_group is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.control_groups.move_to_end(section)
+            return control_group
+
+
+    def put(self, section: ir.Section, control_group: catalog.Group) -> None:
+        with self.lock:
+            self.control_groups[section] = control_group
+            self.control_groups.move_to_end(section)
+            while len(self.control_groups) > self.max_sections:
+                # Drop the least recently used section
+                self.control_groups.popitem(last=False)
+
+
+    def clear(self) -> None:
+        with self.lock:
+            self.control_groups.clear()
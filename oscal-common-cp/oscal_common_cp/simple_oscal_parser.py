@@ -1,76 +1,168 @@
-from oscal_pydantic import document, catalog
-from oscal_pydantic.core import common
+from __future__ import annotations
+
 from datetime import datetime, timezone
 import re
-import uuid
-from html.parser import HTMLParser
+from typing import Any, Iterable, Iterator, TypeVar
+from uuid import UUID
+
+from . import ir
+from .context import ConversionContext
+from .oscal_models import base, catalog, common, document
+from .section_ids import SectionIds, header_hashes_re, header_title, strip_html, title_to_id
+from .section_memo import SectionMemo
+from .stats import ConversionStats
+
+# Bump PARSER_VERSION whenever a change alters the catalogs we generate, since it is part of
+# the key for cached conversions.
+PARSER_VERSION = "0.1.0"
+OSCAL_VERSION = "1.1.2"
 
+ModelT = TypeVar("ModelT", bound="base.OscalModel")
 
 
 
 class SimpleOscalParser:
-    # We rely on the TOC in several places, so we define it first
-    # Turns out this doesn't solve the problem of multiple sections with the same name, so I am abandoning it.
-    toc_dict: dict[str, str] = {}
+    # Anything that changes during a conversion (TOC position, TOC map, IDs) lives in a
+    # ConversionContext rather than on the parser, so a parser can be reused and shared.
     toc_line_re = re.compile(r"^\[(?P<secnum>[\d\.]+)\s(?P<secname>[\w\s-]+)\s\[.*$")
+    version_re = re.compile(r"^Version[\s\-\d]*\s")
+    resource_re = re.compile(r"^(?P<name>.*)\s*(?P<url>http.*)\s*$")
 
 
-    def parse_table_of_contents(self, contents: list[str]):
+    def __init__(self, memoize_sections: bool = True, max_memo_sections: int = 20000) -> None:
+        # Converted sections are remembered across documents, so a new revision of the policy
+        # only rebuilds the sections that changed. See SectionMemo for the caveats.
+        self.section_memo: SectionMemo | None = (
+            SectionMemo(max_memo_sections) if memoize_sections else None
+        )
+
+
+    # We rely on the TOC in several places, so we define it first
+    # Turns out this doesn't solve the problem of multiple sections with the same name, so I am abandoning it.
+    def parse_table_of_contents(self, contents: list[str], context: ConversionContext):
         for line in contents:
             toc_line_match = self.toc_line_re.match(line)
             if toc_line_match is not None:
                 toc_line_dict = toc_line_match.groupdict()
-                self.toc_dict[toc_line_dict["secname"]] = toc_line_dict["secnum"]
-
-
-    # Stupid python trick, initialize with zero using list comprehension
-    toc_pos: list[int] = [0 for _ in range(1, 10)]
-    toc_pos[0] = 1
+                context.toc_dict[toc_line_dict["secname"]] = toc_line_dict["secnum"]
 
 
     # pandoc left some "span" tags in the document, so we need to strip html out of text
     def strip_html_from_text(self, input: str) -> str:
-        return re.sub("<.*>", "", input)
+        return strip_html(input)
         
 
-    # This program relies heavily on the specific format of the tokenized CP documents.
-    def common_policy_to_catalog(self, common_policy: list[str]) -> document.Document:
-        # We will parse the document and store all of the sections as their own list in a nested list
-        sections: list[list[str]] = []
-
+    def split_sections(self, common_policy: Iterable[str]) -> Iterator[list[str]]:
+        # Split the policy into sections, yielding each one as soon as the next header
+        # is reached so that only one section is held in memory at a time.
+        # common_policy can be any iterable of lines - a list, an open file, stdin, etc.
         section: list[str] = []
 
-        # Parse the policy into lists
-        for line in common_policy:
-            if len(line) == 0:
-                # Skip blank lines
-                continue
-            elif line[0] == "#":
-                # We've reached a new section. Assign the strings to the current
-                # section and reset the list
-                sections.append(section.copy())
-                section.clear()
-                section.append(line)
-            else:
-                section.append(line)
+        for policy_line in common_policy:
+            # Iterating over a file only breaks lines at "\n", while str.splitlines() also
+            # breaks them at form feeds, "\u2028" and the like. Splitting every line again here
+            # gives the same sections whichever way the policy was read, and matches the
+            # splitlines() the catalogs in oscal-json were built with. It also drops the line
+            # endings lines read from a file keep.
+            for line in policy_line.splitlines():
+                if len(line) == 0:
+                    # Skip blank lines
+                    continue
+                elif line[0] == "#":
+                    # We've reached a new section. Hand off the current section and
+                    # start a new list, rather than copying the old one.
+                    yield section
+                    section = [line]
+                else:
+                    section.append(line)
 
-        # We have now parsed the policy into a list of lists, where each
-        # outer list represents a section of the document.
+        # NOTE: the lines after the final header are never yielded. The generated catalogs
+        # in oscal-json have always been built this way, so we keep the behavior.
+
+
+    # This program relies heavily on the specific format of the tokenized CP documents.
+    def common_policy_to_catalog(
+        self,
+        common_policy: Iterable[str],
+        deterministic_uuids: bool = False,
+        trusted: bool = False,
+        stats: ConversionStats | None = None,
+    ) -> document.Document:
+        catalog_stream = self.stream_catalog(common_policy, deterministic_uuids, trusted, stats)
+
+        # Build every group before the back-matter - the references section can be anywhere
+        section_groups: list[catalog.Group] = list(catalog_stream.groups)
+
+        with catalog_stream.context.timer("build_catalog"):
+            common_catalog = catalog.Catalog(
+                uuid=catalog_stream.uuid,
+                metadata=catalog_stream.metadata,
+                groups=section_groups,
+                back_matter=catalog_stream.back_matter(),
+            )
+            common_document = document.Document(catalog=common_catalog)
+
+        return common_document
+
+
+    def stream_catalog(
+        self,
+        common_policy: Iterable[str],
+        deterministic_uuids: bool = False,
+        trusted: bool = False,
+        stats: ConversionStats | None = None,
+    ) -> "CatalogStream":
+        # Parse the introduction straight away, but leave the rest of the policy to be
+        # converted one top-level group at a time as the caller iterates over the groups.
+        # Sections are produced lazily, one list of lines per section of the document.
+        sections = self.split_sections(common_policy)
+        if stats is not None:
+            sections = stats.timed_iter("split_sections", sections)
+
+        # Fresh state for every document we convert
+        context = ConversionContext(
+            deterministic_uuids=deterministic_uuids, trusted=trusted, stats=stats
+        )
 
         # The first list is always the introduction/metadata
-        metadata = self.parse_metadata(sections[0])
+        try:
+            introduction = next(sections)
+        except StopIteration:
+            raise ValueError("Policy does not contain any sections.")
+        with context.timer("parse_metadata"):
+            metadata = self.parse_metadata(introduction, context)
+
+        return CatalogStream(
+            parser=self,
+            context=context,
+            uuid=context.make_uuid("catalog", str(metadata.title), str(metadata.version)),
+            metadata=metadata,
+            groups=self.sections_to_groups(self.scan_sections(sections, context), context),
+        )
 
-        # We keep a stack to represent the current place in the TOC
-        parent_stack: list[catalog.Group] = []
 
-        section_groups: list[catalog.Group] = []
+    def scan_policy(
+        self, common_policy: Iterable[str]
+    ) -> Iterator[ir.Introduction | ir.Section | ir.References]:
+        # Run only the scanning stage over a policy: yields the introduction, then a record
+        # for every section and the references, without building any OSCAL objects.
+        sections = self.split_sections(common_policy)
+        context = ConversionContext()
 
-        # Initialize an empty back-matter for later
-        backmatter = None
+        try:
+            yield self.scan_introduction(next(sections), context)
+        except StopIteration:
+            raise ValueError("Policy does not contain any sections.")
 
-        # Step through the sections and generate the appropriate OSCAL objects.
-        # We skip the first section because is it the title page and other stuff
-        for section in sections[1:]:
+        yield from self.scan_sections(sections, context)
+
+
+    def scan_sections(
+        self, sections: Iterator[list[str]], context: ConversionContext
+    ) -> Iterator[ir.Section | ir.References]:
+        # Step through the sections and turn each one into an IR record.
+        # The first section (the title page and other stuff) has already been consumed
+        for section in sections:
             # Check for a couple of special sections that we expect to see: TOC and References
             # First line of section is the contents, so we can check there
             if "Table of Contents" in section[0]:
@@ -78,159 +170,203 @@ class SimpleOscalParser:
                 continue
             # The list of related documents is in a section titled "References" or "Bibliography"
             if "References" in section[0] or "Bibliography" in section[0]:
-                # Pass everything except the title line to parse_backmatter
-                backmatter = self.parse_backmatter(section[1:])
+                # Pass everything except the title line to scan_references
+                with context.timer("scan_references"):
+                    references = self.scan_references(section[1:], context)
+                yield references
                 continue
             
             # Assume every other section is a 
             # The first line has the section title, and because ift is MD,
             # the number of hashes indicate the depth in the TOC
-            header_hashes = re.match(r"#+", section[0])
+            header_hashes = header_hashes_re.match(section[0])
             if header_hashes is not None:
                 section_depth = len(header_hashes.group(0))
 
-                # Parse the section as a group
-                current_group = self.section_to_group(
-                    section_contents=section, section_depth=section_depth
-                )
+                with context.timer("scan_section"):
+                    section_record = self.scan_section(
+                        section_contents=section,
+                        section_number=context.section_number(section_depth),
+                        section_depth=section_depth,
+                        context=context,
+                    )
 
-                # Figure out where the section fits in the overall document
-                if current_group is None:
+                if section_record is None:
                     # Sometimes we get blank headers in the Markdown. skip these.
                     continue
-                else:
-                    # update the TOC counter
-                    self.toc_pos[section_depth - 1] += 1
-
-                    self.toc_pos[section_depth:] = [0 for _ in range(0,9-section_depth)]
-
-                if section_depth == 1:
-                    if len(parent_stack) == 0:
-                        # e.g. this is the first run through the loop
-                        parent_stack = [current_group]
-                    else:
-                        parent_stack[0] = current_group
-                    # Add the top-level group to the final list of groups
-                    section_groups.append(parent_stack[0])
-                else:
-                    # Careful! If we jump more than one level at a time, bad things could happen
-                    if section_depth > len(parent_stack):
-                        parent_stack.append(current_group)
-                        # Add current group to the section above
-                        self.add_subsection_to_parent(
-                            parent_stack[section_depth - 2], current_group
-                        )
-                    elif section_depth == len(parent_stack):
-                        # Replace the previous TOC leaf node with current
-                        parent_stack[section_depth - 1] = current_group
-                        self.add_subsection_to_parent(
-                            parent_stack[section_depth - 2], current_group
-                        )
-                    elif section_depth < len(parent_stack):
-                        # Trim the stack
-                        parent_stack = parent_stack[:section_depth]
-                        # Replace TOC leaf node with current
-                        parent_stack[section_depth - 1] = current_group
-                        self.add_subsection_to_parent(
-                            parent_stack[section_depth - 2], current_group
-                        )
+
+                # update the TOC counter
+                context.advance_toc(section_depth)
+                context.count("sections")
+                yield section_record
             else:
                 raise Exception("Section does not have a title")
 
 
-        if backmatter is None:
-            # back-matter is required, so if we couldn't initialize it, we create an empty one now.
-            backmatter = self.parse_backmatter([])
+    def sections_to_groups(
+        self, section_records: Iterable[ir.Section | ir.References], context: ConversionContext
+    ) -> Iterator[catalog.Group]:
+        # Build the groups for a stream of section records, and fit them together by depth.
+        # Yields each top-level group once all of its subsections have been added to it.
+        # The back-matter is stored on the context when we come across it.
 
-        common_catalog = catalog.Catalog(
-            uuid=uuid.uuid4(),
-            metadata=metadata,
-            groups=section_groups,
-            back_matter=backmatter,
-        )
+        # We keep a stack to represent the current place in the TOC
+        parent_stack: list[catalog.Group] = []
+
+        # The top-level group that subsections are currently being added to
+        top_level_group: catalog.Group | None = None
+
+        for section_record in section_records:
+            if isinstance(section_record, ir.References):
+                with context.timer("build_backmatter"):
+                    context.backmatter = self.build_backmatter(section_record, context)
+                continue
+
+            section_depth = section_record.depth
+            with context.timer("build_group"):
+                current_group = self.build_group(section_record, context)
+
+            # Figure out where the section fits in the overall document
+            if section_depth == 1:
+                if len(parent_stack) == 0:
+                    # e.g. this is the first run through the loop
+                    parent_stack = [current_group]
+                else:
+                    parent_stack[0] = current_group
+                if top_level_group is not None:
+                    # The previous top-level group is complete, hand it over
+                    yield top_level_group
+                top_level_group = parent_stack[0]
+            else:
+                # Careful! If we jump more than one level at a time, bad things could happen
+                if section_depth > len(parent_stack):
+                    parent_stack.append(current_group)
+                    # Add current group to the section above
+                    self.add_subsection_to_parent(
+                        parent_stack[section_depth - 2], current_group, context
+                    )
+                elif section_depth == len(parent_stack):
+                    # Replace the previous TOC leaf node with current
+                    parent_stack[section_depth - 1] = current_group
+                    self.add_subsection_to_parent(
+                        parent_stack[section_depth - 2], current_group, context
+                    )
+                elif section_depth < len(parent_stack):
+                    # Trim the stack
+                    parent_stack = parent_stack[:section_depth]
+                    # Replace TOC leaf node with current
+                    parent_stack[section_depth - 1] = current_group
+                    self.add_subsection_to_parent(
+                        parent_stack[section_depth - 2], current_group, context
+                    )
 
-        return document.Document(catalog=common_catalog)
+        if top_level_group is not None:
+            yield top_level_group
 
 
     def add_subsection_to_parent(
-        self, parent: catalog.Group, child: catalog.Group
+        self, parent: catalog.Group, child: catalog.Group, context: ConversionContext
     ) -> catalog.Group:
         if parent.groups is None:
-            parent.groups = [child]
+            self.set_model_field(parent, "groups", [child], context)
         else:
             parent.groups.append(child)
 
         return parent
 
 
-    def title_to_id(self, title: str) -> str:
-        # Turn "Section Name" into "section-name"
-        id = title.lower().strip().replace(" ", "-")
-        # Some sections have invalid characters in the name. the next line removes them
-        id = "".join([c for c in id if c not in "(),/’:"])
-        return id
-
-
-    def section_to_group(
-        self, section_contents: list[str], section_depth: int
-    ) -> catalog.Group | None:
-        # Derive the section number
-        sec_num = ".".join([str(x) for x in self.toc_pos][:section_depth])
+    def new_model(self, model_class: type[ModelT], context: ConversionContext, **fields: Any) -> ModelT:
+        # In trusted mode, skip pydantic validation: every field value comes from our own code
+        # and is already well formed. Defaults are still filled in by model_construct.
+        if context.trusted:
+            return model_class.model_construct(**fields)
+        else:
+            return model_class(**fields)
 
-        # First line in the title of the group.
-        # Strip off the leading hashes and the trailing space
-        group_title = self.strip_html_from_text(re.sub("#+", "", section_contents[0]).strip())
 
-        if group_title != "":
-            # Turn "Section Name" into "section-name"
-            group_id = f"group-{sec_num}-{self.title_to_id(group_title)}"
+    def set_model_field(
+        self, model: base.OscalModel, field_name: str, value: Any, context: ConversionContext
+    ) -> None:
+        if context.trusted:
+            # OSCAL models validate on assignment, which re-runs the model validators.
+            # Store the value the same way model_construct does instead.
+            model.__dict__[field_name] = value
+            model.__pydantic_fields_set__.add(field_name)
+        else:
+            setattr(model, field_name, value)
 
-            section_group = catalog.Group(
-                id=group_id,
-                title=f"{sec_num} {group_title}",
-            )
 
-            if len(section_contents) > 1:
-                # The section contains requirements, and must have a control
-                # Controls must be inside an inner group since a group can't have both
-                # an innert group and inner controls
-                section_control_group: catalog.Group = catalog.Group(
-                    id=re.sub("group", "control", group_id),
-                    title=f"{group_title} Controls",
-                )
+    def title_to_id(self, title: str) -> str:
+        # Turn "Section Name" into "section-name"
+        # Some sections have invalid characters in the name, these are removed too
+        return title_to_id(title)
 
-                section_control_list: list[catalog.Control] | None = [
-                    self.section_to_control(
-                        section_number=sec_num,
-                        section_contents=section_contents,
-                    )
-                ]
-                section_control_group.controls = section_control_list
-                section_group = self.add_subsection_to_parent(
-                    section_group, section_control_group
-                )
 
-            return section_group
-        else:
+    def section_to_group(
+        self, section_contents: list[str], section_depth: int, context: ConversionContext
+    ) -> catalog.Group | None:
+        section_record = self.scan_section(
+            section_contents=section_contents,
+            section_number=context.section_number(section_depth),
+            section_depth=section_depth,
+            context=context,
+        )
+        if section_record is None:
             return None
+        return self.build_group(section_record, context)
 
 
     def section_to_control(
-        self, section_number: str, section_contents: list[str]
+        self, section_number: str, section_contents: list[str], context: ConversionContext
     ) -> catalog.Control:
-        # Strip off the leading hashes and the surrounding spaces
-        control_title = self.strip_html_from_text(re.sub("#+", "", section_contents[0]).strip())
-        control_id = f"ctrl-{section_number}-{self.title_to_id(control_title)}"
-        control = catalog.Control(
-            id=control_id,
-            title=control_title,
-            parts=[],
+        # Only the title and contents matter to the control, not the depth
+        section_record = self.scan_section(
+            section_contents=section_contents,
+            section_number=section_number,
+            section_depth=0,
+            context=context,
         )
+        if section_record is None:
+            raise ValueError("Section does not have a title")
+        return self.build_control(section_record, context)
+
+
+    def scan_section(
+        self,
+        section_contents: list[str],
+        section_number: str,
+        section_depth: int,
+        context: ConversionContext,
+    ) -> ir.Section | None:
+        # First line in the title of the section.
+        section_title = header_title(section_contents[0])
+
+        if section_title == "":
+            return None
 
-        parts: list[catalog.BasePart] = []
-        part_num = 1
+        return ir.Section(
+            number=section_number,
+            depth=section_depth,
+            title=section_title,
+            blocks=self.scan_section_blocks(section_contents, context),
+        )
+
+
+    def scan_section_blocks(
+        self, section_contents: list[str], context: ConversionContext
+    ) -> tuple[ir.Paragraph | ir.Table, ...] | None:
+        # Returns None when the section has nothing but a title. A section that only holds
+        # html we skip still has a (partless) control, so it gets an empty tuple instead.
+        if len(section_contents) <= 1:
+            return None
+
+        blocks: list[ir.Paragraph | ir.Table] = []
         in_table: bool = False
-        for section_line_number, section_line_text in enumerate(section_contents[1:]):
+        # Find all of the tables up front, keyed by the line they end on
+        table_starts = {
+            end: start for start, end in self.locate_html_tables(section_contents)
+        }
+        for section_line_number, section_line_text in enumerate(section_contents[1:], start=1):
             if "<table" in section_line_text:
                 # We're inside an html table - we should ignore all content until we are out again.
                 in_table = True
@@ -238,45 +374,143 @@ class SimpleOscalParser:
             elif "</table" in section_line_text:
                 in_table = False
                 table_contents = self.parse_html_table(
-                    contents=section_contents, table_end_line=section_line_number
+                    contents=section_contents,
+                    table_start_line=self.table_start_line(
+                        table_starts,
+                        section_line_number,
+                        f"section {header_title(section_contents[0])!r}",
+                    ),
+                    table_end_line=section_line_number,
+                    context=context,
                 )
-                for row in table_contents:
-                    parts.append(
-                        catalog.StatementPart(
-                            id=f"{re.sub("ctrl", "stmt", control_id)}-{part_num}",
-                            name="statement",
-                            prose="|" + "|".join(row) + "|",
-                        )
-                    )
-                    part_num += 1
+                blocks.append(ir.Table(rows=tuple(tuple(row) for row in table_contents)))
             elif in_table:
                 continue
             elif section_line_text[0] == "<":
                 # There is sometimes embedded html, which we don't want to include
                 continue
             else:
-                # If we get here, it's a regular text line
+                # If we get here, it's a regular text line. Strip any html left in.
+                blocks.append(ir.Paragraph(text=strip_html(section_line_text)))
+
+        return tuple(blocks)
+
+
+    def build_group(self, section: ir.Section, context: ConversionContext) -> catalog.Group:
+        sec_num = section.number
+        group_title = section.title
+
+        # All of the IDs for the section, worked out once
+        section_ids = SectionIds(sec_num, group_title)
+        group_id = context.register_id(section_ids.group_id)
+
+        section_group = self.new_model(
+            catalog.Group,
+            context,
+            id=group_id,
+            title=f"{sec_num} {group_title}",
+        )
+        context.count("groups")
+
+        if section.blocks is not None:
+            # The section contains requirements, and must have a control
+            # An identical section at the same place in the TOC may already have been
+            # converted, e.g. in an earlier revision of the policy
+            section_control_group = None
+            if self.section_memo is not None:
+                section_control_group = self.section_memo.get(section)
+
+            if section_control_group is None:
+                # Controls must be inside an inner group since a group can't have both
+                # an innert group and inner controls
+                section_control_group = self.new_model(
+                    catalog.Group,
+                    context,
+                    id=section_ids.control_group_id,
+                    title=f"{group_title} Controls",
+                )
+
+                section_control_list: list[catalog.Control] | None = [
+                    self.build_control(section, context, section_ids)
+                ]
+                self.set_model_field(
+                    section_control_group, "controls", section_control_list, context
+                )
+                if self.section_memo is not None and not context.trusted:
+                    self.section_memo.put(section, section_control_group)
+            elif section_control_group.controls is not None:
+                # Reused controls still count towards this document's IDs
+                context.count("memo_hits")
+                for control in section_control_group.controls:
+                    context.register_id(control.id)
+                    context.count("controls")
+                    context.count("parts", len(control.parts or []))
+            context.count("groups")
+
+            section_group = self.add_subsection_to_parent(
+                section_group, section_control_group, context
+            )
+
+        return section_group
+
+
+    def build_control(
+        self,
+        section: ir.Section,
+        context: ConversionContext,
+        section_ids: SectionIds | None = None,
+    ) -> catalog.Control:
+        if section_ids is None:
+            section_ids = SectionIds(section.number, section.title)
+        control = self.new_model(
+            catalog.Control,
+            context,
+            id=context.register_id(section_ids.control_id),
+            title=section_ids.title,
+            parts=[],
+        )
+
+        parts: list[catalog.BasePart] = []
+        part_num = 1
+        for block in section.blocks or ():
+            if isinstance(block, ir.Table):
+                prose_lines = ["|" + "|".join(row) + "|" for row in block.rows]
+            else:
+                prose_lines = [block.text]
+
+            for prose in prose_lines:
                 parts.append(
-                    catalog.StatementPart(
-                        id=f"{re.sub("ctrl", "stmt", control_id)}-{part_num}",
+                    self.new_model(
+                        catalog.StatementPart,
+                        context,
+                        id=section_ids.statement_id(part_num),
                         name="statement",
-                        prose=self.strip_html_from_text(section_line_text), # Strip any html left in.
+                        prose=prose,
                     )
                 )
                 part_num += 1
 
-        control.parts = parts
+        self.set_model_field(control, "parts", parts, context)
+        context.count("controls")
+        context.count("parts", len(parts))
 
         return control
 
 
-    def parse_metadata(self, introduction: list[str]) -> common.Metadata:
+    def parse_metadata(self, introduction: list[str], context: ConversionContext) -> common.Metadata:
+        return self.build_metadata(self.scan_introduction(introduction, context), context)
+
+
+    def scan_introduction(self, introduction: list[str], context: ConversionContext) -> ir.Introduction:
         version = ""
         published = None
         revisions = None
         in_table: bool = False  # track if we're in a table
         in_toc: bool = False  # track if we're in a TOC
         toc_lines: list[str] = []  # lines of the TOC to pass to the toc parser
+        table_starts = {
+            end: start for start, end in self.locate_html_tables(introduction)
+        }
         for line_number, line in enumerate(introduction):
             if line == "":
                 # Blank line, ignore and move on
@@ -287,9 +521,13 @@ class SimpleOscalParser:
             elif "</table" in line:
                 in_table = False
                 # Revision history is maintained in a table - parse it
-                # Function works backwards from the END of a table, hence </table>
-                revision_table = self.parse_html_table(introduction, line_number)
-                revisions = self.revision_history_to_revisions(revision_table)
+                revision_table = self.parse_html_table(
+                    introduction,
+                    self.table_start_line(table_starts, line_number, "the introduction"),
+                    line_number,
+                    context,
+                )
+                revisions = self.scan_revisions(revision_table)
                 continue
             elif in_table:
                 continue
@@ -300,7 +538,7 @@ class SimpleOscalParser:
             elif "Version " in line and not in_toc:
                 # Parse out the version number then move on
                 # complicated pattern because of some strange inputs
-                version = re.sub(r"^Version[\s\-\d]*\s", "", line)
+                version = self.version_re.sub("", line)
                 continue
             elif line[0] in "*<>[(" and not in_toc:
                 # First character of the line indicates it's a structural or other
@@ -316,35 +554,58 @@ class SimpleOscalParser:
                 except ValueError:
                     continue
 
-        self.parse_table_of_contents(toc_lines)
+        self.parse_table_of_contents(toc_lines, context)
 
         if version == "" or published is None:
             raise ValueError("Introduction is missing Version and/or Publication Date.")
-        else:
-            return common.Metadata(
-                title="X.509 Certificate Policy for the U.S. Federal PKI Common Policy Framework",
-                published=published.isoformat(),
-                version=version,
-                oscal_version="1.1.2",  # TODO
-                revisions=revisions,
-            )
+
+        return ir.Introduction(
+            version=version,
+            published=published.isoformat(),
+            revisions=revisions,
+        )
 
 
-    def parse_backmatter(self, contents: list[str]) -> common.BackMatter:
-        # Parse the "References" in Appendix B and convert them to Resources in back-matter
+    def build_metadata(self, introduction: ir.Introduction, context: ConversionContext) -> common.Metadata:
+        metadata = common.Metadata(
+            title="X.509 Certificate Policy for the U.S. Federal PKI Common Policy Framework",
+            published=introduction.published,
+            version=introduction.version,
+            oscal_version=OSCAL_VERSION,  # TODO
+            revisions=(
+                self.build_revisions(introduction.revisions)
+                if introduction.revisions is not None
+                else None
+            ),
+        )
+        if context.deterministic_uuids:
+            # last-modified defaults to the time of conversion, which would make every
+            # run different. Use the publication date of the policy instead.
+            metadata.last_modified = introduction.published
+        context.count("revisions", len(metadata.revisions or []))
+        return metadata
+
+
+    def parse_backmatter(self, contents: list[str], context: ConversionContext) -> common.BackMatter:
+        return self.build_backmatter(self.scan_references(contents, context), context)
+
+
+    def scan_references(self, contents: list[str], context: ConversionContext) -> ir.References:
+        # Parse the "References" in Appendix B
         resource_table: list[list[str]] = []
-        resource_list: list[common.Resource] = []
+        references: list[ir.Reference] = []
 
         # References are passed in as an html table - parse it
-        for index, line in enumerate(contents):
-            if "</table" in line:
-                resource_table = self.parse_html_table(contents=contents, table_end_line=index-1) # Have to subtract 1 from index for the parse_html_table function
-        
-        resource_re = re.compile(r"^(?P<name>.*)\s*(?P<url>http.*)\s*$")
+        # If there is more than one table, the last one holds the references
+        table_spans = self.locate_html_tables(contents)
+        if len(table_spans) > 0:
+            table_start, table_end = table_spans[-1]
+            resource_table = self.parse_html_table(contents, table_start, table_end, context)
+
         # Format should be document_title, description, URL
         for resource in resource_table:
             resource_title = resource[0]
-            resource_re_matches = resource_re.match(resource[1])
+            resource_re_matches = self.resource_re.match(resource[1])
             if resource_re_matches is not None:
                 match_dict = resource_re_matches.groupdict()
                 resource_descripton = match_dict["name"]
@@ -354,22 +615,40 @@ class SimpleOscalParser:
                 # OSCAL resources have to include a URL, so skip this one.
                 continue
 
+            references.append(
+                ir.Reference(
+                    title=resource_title, description=resource_descripton, url=resource_url
+                )
+            )
+
+        return ir.References(references=tuple(references))
+
+
+    def build_backmatter(self, references: ir.References, context: ConversionContext) -> common.BackMatter:
+        # Convert the references to Resources in back-matter
+        resource_list: list[common.Resource] = []
+        for reference in references.references:
             resource_list.append(
                 common.Resource(
-                    uuid = uuid.uuid4(), # We are creating a new resource UUID every time - this should be re-considered
-                    title=resource_title,
-                    description=resource_descripton,
+                    uuid=context.make_uuid("resource", reference.title, reference.url),
+                    title=reference.title,
+                    description=reference.description,
                     rlinks=[
-                        common.ResourceLink(href=resource_url)
+                        common.ResourceLink(href=reference.url)
                     ],
                 )
             )
 
+        context.count("resources", len(resource_list))
         return common.BackMatter(resources=resource_list)
 
 
     def revision_history_to_revisions(self, revisions: list[list[str]]) -> list[common.Revision]:
-        revision_list: list[common.Revision] = []
+        return self.build_revisions(self.scan_revisions(revisions))
+
+
+    def scan_revisions(self, revisions: list[list[str]]) -> tuple[ir.Revision, ...]:
+        revision_list: list[ir.Revision] = []
         for row in revisions[1:]:
             version_id = row[0]
             try:
@@ -382,66 +661,97 @@ class SimpleOscalParser:
                 # If we can't parse the date, we're probably in a weird header row
                 continue
             revision_details = row[2]
+            revision_list.append(
+                ir.Revision(version=version_id, published=published_date, remarks=revision_details)
+            )
+
+        return tuple(revision_list)
+
+
+    def build_revisions(self, revisions: Iterable[ir.Revision]) -> list[common.Revision]:
+        revision_list: list[common.Revision] = []
+        for revision in revisions:
             revision_record = common.Revision(
-                version=version_id,
-                published=published_date,
-                remarks=revision_details,
+                version=revision.version,
+                published=revision.published,
+                remarks=revision.remarks,
             )
             revision_list.append(revision_record)
 
         return revision_list
 
 
-    def parse_html_table(self, contents: list[str], table_end_line: int) -> list[list[str]]:
-        # Start with the end of the table
-        current_line = table_end_line + 1
-
-        # Walk up until we find the opening tag
-        while "<table" not in contents[current_line]:
-            current_line -= 1
-
-        table_list = contents[current_line : table_end_line + 2]
-
-        # It's weird to define a class inside a function, but this is how HTMLParser works.
-        class TableParser(HTMLParser):
-            parsed_table: list[list[str]] = []
-            current_row: list[str] = []
-            current_cell: str
-            in_row: bool = False
-            in_cell: bool = False
-
-            def handle_starttag(
-                self, tag: str, attrs: list[tuple[str, str | None]]
-            ) -> None:
-                if tag == "tr":
-                    # We're starting a new row
-                    self.current_row = []
-                    self.in_row = True
-                if tag == "td":
-                    self.current_cell = ""
-                    self.in_cell = True
-
-            def handle_endtag(self, tag: str) -> None:
-                if tag == "tr":
-                    self.parsed_table.append(self.current_row)
-                    self.in_row = False
-                if tag == "td":
-                    self.current_row.append(self.current_cell)
-                    self.in_cell = False
-                else:
-                    # There are some style tags in the rows - we want a space between the contents
-                    if self.in_row and self.in_cell:
-                        # Add a space to the cell we're processing now.
-                        self.current_cell = self.current_cell + " "
-
-            def handle_data(self, data: str) -> None:
-                if self.in_row and self.in_cell:
-                    self.current_cell = self.current_cell + data
-
-            def return_results(self) -> list[list[str]]:
-                return self.parsed_table
+    def locate_html_tables(self, contents: list[str]) -> list[tuple[int, int]]:
+        # Make a single pass over the lines and record the (start, end) line of every table,
+        # so each table can be parsed straight from its span without searching for it.
+        table_spans: list[tuple[int, int]] = []
+        table_start: int | None = None
+
+        for line_number, line in enumerate(contents):
+            if "<table" in line:
+                table_start = line_number
+            # Not an elif: a table can open and close on the same line
+            if "</table" in line and table_start is not None:
+                # A closing tag belongs to the nearest opening tag above it
+                table_spans.append((table_start, line_number))
+                table_start = None
+
+        return table_spans
+
+
+    def table_start_line(self, table_starts: dict[int, int], table_end_line: int, location: str) -> int:
+        # table_starts maps the end line of each table found by locate_html_tables() to its
+        # start line
+        if table_end_line not in table_starts:
+            raise ValueError(f"</table> without a matching <table> in {location}")
+        return table_starts[table_end_line]
+
+
+    def parse_html_table(
+        self,
+        contents: list[str],
+        table_start_line: int,
+        table_end_line: int,
+        context: ConversionContext,
+    ) -> list[list[str]]:
+        # The span includes both the <table> and </table> lines
+        table_list = contents[table_start_line : table_end_line + 1]
+
+        context.count("tables")
+        with context.timer("parse_html_table"):
+            return context.table_parser.parse("".join(table_list))
+
+
+class CatalogStream:
+    # A catalog that is converted as it is read: the metadata is available straight away,
+    # and the top-level groups are built one at a time while iterating over groups.
+    # back_matter() is only complete once every group has been consumed.
+
+    def __init__(
+        self,
+        parser: SimpleOscalParser,
+        context: ConversionContext,
+        uuid: UUID,
+        metadata: common.Metadata,
+        groups: Iterator[catalog.Group],
+    ) -> None:
+        self.parser = parser
+        self.context = context
+        self.uuid = uuid
+        self.metadata = metadata
+        self.groups = groups
+
+
+    def back_matter(self) -> common.BackMatter:
+        if self.context.backmatter is None:
+            # back-matter is required, so if we couldn't initialize it, we create an empty one now.
+            self.context.backmatter = self.parser.parse_backmatter([], self.context)
+        return self.context.backmatter
 
-        table_parser = TableParser()
-        table_parser.feed("".join(table_list))
-        return table_parser.return_results()
 
+def validate_catalog(common_catalog: document.Document) -> document.Document:
+    # A single validation pass over a finished document, e.g. one built in trusted mode.
+    # Round-trips through a dict so every nested model is checked, not just the top level.
+    return document.Document.model_validate(
+        common_catalog.model_dump(by_alias=True, exclude_none=True)
+    )
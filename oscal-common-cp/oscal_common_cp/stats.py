@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from typing import Any, Iterator, TypeVar
+import time
+
+T = TypeVar("T")
+
+
+class ConversionStats:
+    # Wall time and call counts for each stage of a conversion, and how many of each kind of
+    # object it produced. Pass one to common_policy_to_catalog or stream_catalog to fill in.
+    #
+    # Stage times are inclusive: e.g. scan_section includes the parse_html_table calls made
+    # while scanning the section.
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        self.counts: dict[str, int] = {}
+
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - start_time
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+
+    def timed_iter(self, stage: str, items: Iterator[T]) -> Iterator[T]:
+        # Time the work a generator does between items, e.g. split_sections reading lines
+        while True:
+            with self.timer(stage):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+            yield item
+
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "seconds": dict(self.seconds),
+            "calls": dict(self.calls),
+            "counts": dict(self.counts),
+        }
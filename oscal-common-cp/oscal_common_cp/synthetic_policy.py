@@ -0,0 +1,314 @@
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterator
+import argparse
+import itertools
+import random
+import sys
+
+# Words used to make up section titles and prose. Titles may only contain word characters,
+# spaces and dashes, or the TOC lines won't match SimpleOscalParser.toc_line_re.
+TITLE_WORDS = [
+    "Certificate", "Policy", "Authority", "Key", "Management", "Identification",
+    "Authentication", "Revocation", "Suspension", "Repository", "Audit", "Archive",
+    "Personnel", "Facility", "Security", "Controls", "Profile", "Compliance",
+    "Subscriber", "Relying", "Party", "Validation", "Naming", "Renewal",
+]
+PROSE_WORDS = [
+    "the", "CA", "shall", "must", "ensure", "that", "all", "certificates", "are",
+    "issued", "in", "accordance", "with", "this", "policy", "and", "its", "CPS",
+    "subscriber", "private", "key", "records", "retained", "for", "at", "least",
+    "years", "audit", "logs", "reviewed", "by", "trusted", "roles", "FPKIPA",
+]
+
+
+class SyntheticPolicy:
+    # Generates a tokenized Common Policy in the same markdown format as the real ones: a
+    # title page with the Version and date lines, an html revision history table, a TOC, "#"
+    # headed sections nested up to max_depth, html tables in some sections and a References
+    # appendix. Used to load-test the parser on inputs far larger than the real documents.
+    #
+    # The same settings and seed always give the same document. Lines are generated as they
+    # are read, so even very large documents never need to fit in memory.
+
+    def __init__(
+        self,
+        sections: int = 1000,
+        max_depth: int = 3,
+        branching: int = 4,
+        paragraphs_per_section: int = 3,
+        words_per_paragraph: int = 40,
+        table_density: float = 0.2,
+        table_rows: int = 4,
+        table_columns: int = 3,
+        revisions: int = 10,
+        references: int = 20,
+        version: str = "9.0",
+        published: date = date(2024, 1, 1),
+        seed: int = 0,
+    ) -> None:
+        self.sections = sections
+        # Sections are numbered depth first: 1, 1.1, 1.1.1, ... with up to branching
+        # subsections under each section
+        self.max_depth = max_depth
+        self.branching = branching
+        self.paragraphs_per_section = paragraphs_per_section
+        self.words_per_paragraph = words_per_paragraph
+        # Chance of a section containing an html table
+        self.table_density = table_density
+        self.table_rows = table_rows
+        self.table_columns = table_columns
+        self.revisions = revisions
+        self.references = references
+        self.version = version
+        self.published = published
+        self.seed = seed
+
+
+    @classmethod
+    def sections_for_lines(cls, target_lines: int, **options) -> "SyntheticPolicy":
+        # A policy with roughly target_lines lines, with the sections sized by the options
+        policy = cls(**options)
+        policy.sections = max(1, round(target_lines / policy.lines_per_section()))
+        return policy
+
+
+    def lines_per_section(self) -> float:
+        # Header and paragraphs are each followed by a blank line. A table takes a line per
+        # row plus the <table> and </table> lines and a blank line.
+        return (
+            2
+            + 2 * self.paragraphs_per_section
+            + self.table_density * (self.table_rows + 3)
+        )
+
+
+    def section_numbers(self) -> Iterator[tuple[int, ...]]:
+        def subtree(section_number: tuple[int, ...]) -> Iterator[tuple[int, ...]]:
+            yield section_number
+            if len(section_number) < self.max_depth:
+                for child in range(1, self.branching + 1):
+                    yield from subtree(section_number + (child,))
+
+        all_sections = itertools.chain.from_iterable(
+            subtree((top_level,)) for top_level in itertools.count(1)
+        )
+        return itertools.islice(all_sections, self.sections)
+
+
+    def section_title(self, section_number: tuple[int, ...]) -> str:
+        # The title has to be the same in the TOC and the section, so it is derived from
+        # the section number rather than the shared random stream
+        title_rng = random.Random(f"{self.seed}-{section_number}")
+        return " ".join(title_rng.sample(TITLE_WORDS, k=3))
+
+
+    def format_date(self, day: date) -> str:
+        # e.g. "November 3, 2023", which is what the parser reads with "%B %d, %Y"
+        return f"{day:%B} {day.day}, {day.year}"
+
+
+    def prose(self, rng: random.Random, words: int) -> str:
+        sentence = " ".join(rng.choice(PROSE_WORDS) for _ in range(words))
+        return sentence[0].upper() + sentence[1:] + "."
+
+
+    def lines(self) -> Iterator[str]:
+        rng = random.Random(self.seed)
+
+        yield from self.introduction_lines(rng)
+
+        for section_number in self.section_numbers():
+            yield from self.section_lines(rng, section_number)
+
+        yield from self.references_lines()
+
+        # The parser never reads past the last header, so the document has to end with one
+        # more section, as the real policies do
+        yield "# Appendix C: Acronyms"
+        yield ""
+        yield "CA Certification Authority"
+
+
+    def introduction_lines(self, rng: random.Random) -> Iterator[str]:
+        yield "**X.509 Certificate Policy**"
+        yield ""
+        yield "**For The**"
+        yield ""
+        yield "**U.S. Federal PKI Common Policy Framework**"
+        yield ""
+        yield f"Version {self.version}"
+        yield ""
+        yield self.format_date(self.published)
+        yield ""
+
+        # Revision history, oldest first, ending at the current version
+        yield "<table>"
+        yield "<tbody>"
+        yield "<tr>"
+        yield "<td>Version</td>"
+        yield "<td>Date</td>"
+        yield "<td>Details</td>"
+        yield "</tr>"
+        for revision in range(1, self.revisions + 1):
+            revision_date = self.published - timedelta(days=90 * (self.revisions - revision))
+            yield "<tr>"
+            yield f"<td>{revision}.0</td>"
+            yield f"<td>{self.format_date(revision_date)}</td>"
+            yield f"<td>{self.prose(rng, 8)}</td>"
+            yield "</tr>"
+        yield "</tbody>"
+        yield "</table>"
+        yield ""
+
+        yield "Table of Contents"
+        yield ""
+        for page, section_number in enumerate(self.section_numbers(), start=1):
+            section_text = ".".join(str(x) for x in section_number)
+            section_title = self.section_title(section_number)
+            anchor = section_title.lower().replace(" ", "-")
+            yield f"[{section_text} {section_title} [{page}](#{anchor})](#{anchor})"
+            yield ""
+
+
+    def section_lines(self, rng: random.Random, section_number: tuple[int, ...]) -> Iterator[str]:
+        yield "#" * len(section_number) + " " + self.section_title(section_number)
+        yield ""
+
+        table_paragraph = -1
+        if rng.random() < self.table_density:
+            table_paragraph = rng.randrange(self.paragraphs_per_section + 1)
+
+        for paragraph in range(self.paragraphs_per_section + 1):
+            if paragraph == table_paragraph:
+                yield "<table>"
+                for _ in range(self.table_rows):
+                    cells = "".join(
+                        f"<td>{self.prose(rng, 4)}</td>" for _ in range(self.table_columns)
+                    )
+                    yield f"<tr>{cells}</tr>"
+                yield "</table>"
+                yield ""
+            if paragraph < self.paragraphs_per_section:
+                yield self.prose(rng, self.words_per_paragraph)
+                yield ""
+
+
+    def references_lines(self) -> Iterator[str]:
+        yield "# Appendix B: References"
+        yield ""
+        yield "<table>"
+        for reference in range(1, self.references + 1):
+            yield (
+                f"<tr><td>REF{reference}</td>"
+                f"<td>Reference document {reference}, 2024-01-01. "
+                f"https://example.com/references/{reference}</td></tr>"
+            )
+        yield "</table>"
+        yield ""
+
+
+    def write(self, output) -> None:
+        for line in self.lines():
+            output.write(line + "\n")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        prog="oscal_common_cp.synthetic_policy",
+        description="Generate a synthetic tokenized Common Policy for load testing the parser.",
+    )
+    size_group = arg_parser.add_mutually_exclusive_group()
+    size_group.add_argument(
+        "--sections",
+        dest="sections",
+        type=int,
+        help="Number of sections to generate (default: 1000)",
+        default=1000,
+    )
+    size_group.add_argument(
+        "--lines",
+        dest="lines",
+        type=int,
+        help="Generate about this many lines instead of a fixed number of sections",
+        default=None,
+    )
+    arg_parser.add_argument(
+        "--max-depth",
+        dest="max_depth",
+        type=int,
+        help="Deepest header level to use (default: 3)",
+        default=3,
+    )
+    arg_parser.add_argument(
+        "--branching",
+        dest="branching",
+        type=int,
+        help="Number of subsections under each section (default: 4)",
+        default=4,
+    )
+    arg_parser.add_argument(
+        "--paragraphs",
+        dest="paragraphs_per_section",
+        type=int,
+        help="Paragraphs of prose in each section (default: 3)",
+        default=3,
+    )
+    arg_parser.add_argument(
+        "--table-density",
+        dest="table_density",
+        type=float,
+        help="Fraction of sections that contain an html table (default: 0.2)",
+        default=0.2,
+    )
+    arg_parser.add_argument(
+        "--table-rows",
+        dest="table_rows",
+        type=int,
+        help="Rows in each html table (default: 4)",
+        default=4,
+    )
+    arg_parser.add_argument(
+        "--references",
+        dest="references",
+        type=int,
+        help="Number of references in the References appendix (default: 20)",
+        default=20,
+    )
+    arg_parser.add_argument(
+        "--seed",
+        dest="seed",
+        type=int,
+        help="Random seed, the same seed and options give the same document (default: 0)",
+        default=0,
+    )
+    arg_parser.add_argument(
+        "-o",
+        "--output",
+        dest="output",
+        type=Path,
+        help="File to write the policy to (default: stdout)",
+        default=None,
+    )
+
+    args = arg_parser.parse_args()
+
+    policy_options = dict(
+        max_depth=args.max_depth,
+        branching=args.branching,
+        paragraphs_per_section=args.paragraphs_per_section,
+        table_density=args.table_density,
+        table_rows=args.table_rows,
+        references=args.references,
+        seed=args.seed,
+    )
+    if args.lines is not None:
+        policy = SyntheticPolicy.sections_for_lines(args.lines, **policy_options)
+    else:
+        policy = SyntheticPolicy(sections=args.sections, **policy_options)
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            policy.write(output_file)
+    else:
+        policy.write(sys.stdout)
@@ -0,0 +1,110 @@
+from html import unescape
+from html.parser import HTMLParser
+import re
+
+
+class TableParser(HTMLParser):
+    # Turns an html table into a list of rows, where each row is a list of cell strings.
+    # All of the parsing state lives on the instance and is cleared by reset(), so a single
+    # parser can be reused for any number of tables. Don't share one parser between threads.
+    parsed_table: list[list[str]]
+    current_row: list[str]
+    current_cell: str
+    in_row: bool
+    in_cell: bool
+
+    # Matches the tags the fast path understands. Anything else (comments, declarations,
+    # stray "<" characters) is left unmatched, which sends the table to HTMLParser instead.
+    simple_tag_re = re.compile(
+        r"<(?:/(?P<endtag>[a-zA-Z][-.a-zA-Z0-9:_]*)\s*"
+        r"|(?P<starttag>[a-zA-Z][^\t\n\r\f />\x00]*)"
+        r"(?:\s+[^\s=/>\"']+(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'>]+))?)*\s*(?P<selfclosing>/?))>"
+    )
+
+    # The contents of these tags are not parsed as html, so leave them to HTMLParser
+    cdata_tags = ("script", "style")
+
+
+    def reset(self) -> None:
+        # HTMLParser.__init__ calls reset(), so this is where the table state is created
+        super().reset()
+        self.parsed_table = []
+        self.current_row = []
+        self.current_cell = ""
+        self.in_row = False
+        self.in_cell = False
+
+
+    def parse(self, table_html: str) -> list[list[str]]:
+        self.reset()
+        if not self.parse_simple_table(table_html):
+            # The fast path couldn't handle the markup, start over with the full parser
+            self.reset()
+            self.feed(table_html)
+
+        return self.parsed_table
+
+
+    def parse_simple_table(self, table_html: str) -> bool:
+        # Fast path for plain <tr><td> markup: find the tags with a single regex and call
+        # the handlers directly, skipping HTMLParser's general purpose tokenizer.
+        # Returns False if the markup is something we don't handle here.
+        position = 0
+        for tag_match in self.simple_tag_re.finditer(table_html):
+            if not self.handle_simple_data(table_html[position : tag_match.start()]):
+                return False
+
+            end_tag = tag_match.group("endtag")
+            if end_tag is not None:
+                self.handle_endtag(end_tag.lower())
+            else:
+                start_tag = tag_match.group("starttag").lower()
+                if start_tag in self.cdata_tags:
+                    return False
+                self.handle_starttag(start_tag, [])
+                if tag_match.group("selfclosing"):
+                    # e.g. <br/>, which HTMLParser reports as a start and an end tag
+                    self.handle_endtag(start_tag)
+
+            position = tag_match.end()
+
+        return self.handle_simple_data(table_html[position:])
+
+
+    def handle_simple_data(self, data: str) -> bool:
+        if "<" in data:
+            # Markup the fast path regex didn't recognize
+            return False
+        if data != "":
+            # HTMLParser converts character references before handing over data, so we do too
+            self.handle_data(unescape(data))
+        return True
+
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag == "tr":
+            # We're starting a new row
+            self.current_row = []
+            self.in_row = True
+        if tag == "td":
+            self.current_cell = ""
+            self.in_cell = True
+
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "tr":
+            self.parsed_table.append(self.current_row)
+            self.in_row = False
+        if tag == "td":
+            self.current_row.append(self.current_cell)
+            self.in_cell = False
+        else:
+            # There are some style tags in the rows - we want a space between the contents
+            if self.in_row and self.in_cell:
+                # Add a space to the cell we're processing now.
+                self.current_cell = self.current_cell + " "
+
+
+    def handle_data(self, data: str) -> None:
+        if self.in_row and self.in_cell:
+            self.current_cell = self.current_cell + data
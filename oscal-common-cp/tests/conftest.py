@@ -0,0 +1,9 @@
+import pytest
+
+from oscal_common_cp.synthetic_policy import SyntheticPolicy
+
+
+@pytest.fixture
+def policy_lines() -> list[str]:
+    # A small generated policy with tables in half of its sections
+    return list(SyntheticPolicy(sections=40, table_density=0.5, seed=3).lines())
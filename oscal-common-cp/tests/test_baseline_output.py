@@ -0,0 +1,52 @@
+from pathlib import Path
+from typing import Any
+import json
+
+import pytest
+
+from oscal_common_cp.batch import ConversionOptions, convert_file
+from oscal_common_cp.catalog_writer import serialize_catalog
+from oscal_common_cp.simple_oscal_parser import SimpleOscalParser
+
+FIXTURES_DIR = Path.joinpath(Path(__file__).parent, "fixtures")
+POLICY_PATH = Path.joinpath(FIXTURES_DIR, "common-policy.md")
+# What the original parser made of the policy, with the random and time dependent fields
+# blanked out by normalized()
+BASELINE_PATH = Path.joinpath(FIXTURES_DIR, "common-policy.baseline.json")
+
+
+def normalized(catalog_json: str) -> dict[str, Any]:
+    catalog_document = json.loads(catalog_json)
+    catalog_document["catalog"]["uuid"] = None
+    catalog_document["catalog"]["metadata"]["last-modified"] = None
+    for resource in catalog_document["catalog"]["back-matter"].get("resources", []):
+        resource["uuid"] = None
+    return catalog_document
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ConversionOptions(),
+        ConversionOptions(streaming=True),
+        ConversionOptions(trusted=True),
+        ConversionOptions(serializer="orjson", pretty=False),
+    ],
+    ids=["default", "streaming", "trusted", "compact"],
+)
+def test_convert_file_matches_baseline(tmp_path: Path, options: ConversionOptions) -> None:
+    if options.serializer == "orjson":
+        pytest.importorskip("orjson")
+    result = convert_file(POLICY_PATH, tmp_path, options)
+
+    assert result.succeeded, result.error
+    assert normalized(result.output_path.read_text()) == json.loads(BASELINE_PATH.read_text())
+
+
+def test_policy_text_matches_baseline() -> None:
+    # As the daemon and the HTTP service convert it
+    common_catalog = SimpleOscalParser().common_policy_to_catalog(
+        POLICY_PATH.read_text().splitlines()
+    )
+
+    assert normalized(serialize_catalog(common_catalog)) == json.loads(BASELINE_PATH.read_text())
@@ -0,0 +1,68 @@
+from pathlib import Path
+from typing import TextIO
+
+import pytest
+
+from oscal_common_cp.batch import ConversionOptions, convert_batch
+from oscal_common_cp.catalog_writer import write_catalog_file
+from oscal_common_cp.synthetic_policy import SyntheticPolicy
+
+
+def write_policy(policy_path: Path, version: str) -> Path:
+    policy_path.write_text("\n".join(SyntheticPolicy(sections=20, version=version).lines()))
+    return policy_path
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_writes_only_finished_catalogs(tmp_path: Path, workers: int) -> None:
+    input_dir = Path.joinpath(tmp_path, "policies")
+    input_dir.mkdir()
+    output_dir = Path.joinpath(tmp_path, "oscal-json")
+    input_paths = [
+        write_policy(Path.joinpath(input_dir, "a.md"), "1.0"),
+        Path.joinpath(input_dir, "broken.md"),
+        write_policy(Path.joinpath(input_dir, "b.md"), "2.0"),
+    ]
+    input_paths[1].write_text("No sections here\n")
+
+    results = convert_batch(input_paths, output_dir, ConversionOptions(), workers=workers)
+
+    assert [result.succeeded for result in results] == [True, False, True]
+    # Nothing but the two catalogs: no temporary files, staging directories or partial output
+    assert sorted(output_dir.iterdir()) == sorted(
+        result.output_path for result in results if result.succeeded
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_keeps_the_first_of_two_catalogs_with_one_name(tmp_path: Path, workers: int) -> None:
+    output_dir = Path.joinpath(tmp_path, "oscal-json")
+    input_paths = [
+        write_policy(Path.joinpath(tmp_path, "a.md"), "9.0"),
+        write_policy(Path.joinpath(tmp_path, "b.md"), "9.0"),
+    ]
+    # Same version, different contents
+    input_paths[1].write_text(input_paths[1].read_text().replace("Security", "Secure"))
+
+    results = convert_batch(input_paths, output_dir, ConversionOptions(), workers=workers)
+
+    assert results[0].succeeded
+    assert not results[1].succeeded
+    assert "a.md" in results[1].error
+    assert list(output_dir.iterdir()) == [results[0].output_path]
+    assert "Secure " not in results[0].output_path.read_text()
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path: Path) -> None:
+    output_path = Path.joinpath(tmp_path, "catalog.json")
+    output_path.write_text("the previous catalog")
+
+    def write_half(catalog_file: TextIO) -> None:
+        catalog_file.write('{"catalog": ')
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        write_catalog_file(output_path, write_half)
+
+    assert list(tmp_path.iterdir()) == [output_path]
+    assert output_path.read_text() == "the previous catalog"
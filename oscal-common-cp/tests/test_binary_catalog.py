@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+from typing import Any, Iterator
+
+from oscal_common_cp.binary_catalog import BinaryCatalog, write_binary_catalog
+from oscal_common_cp.catalog_loader import LazyCatalog
+from oscal_common_cp.catalog_writer import serialize_catalog
+from oscal_common_cp.simple_oscal_parser import SimpleOscalParser
+from oscal_common_cp.synthetic_policy import SyntheticPolicy
+
+
+def catalog_document() -> dict[str, Any]:
+    common_catalog = SimpleOscalParser(memoize_sections=False).common_policy_to_catalog(
+        SyntheticPolicy(sections=40).lines(), deterministic_uuids=True
+    )
+    return json.loads(serialize_catalog(common_catalog))
+
+
+def raw_controls(raw_node: dict[str, Any], depth: int = 0) -> Iterator[tuple[dict[str, Any], int]]:
+    # Every control with its depth, in document order
+    for raw_group in raw_node.get("groups", []):
+        for raw_control in raw_group.get("controls", []):
+            yield raw_control, depth + 1
+        yield from raw_controls(raw_group, depth + 1)
+
+
+def test_binary_catalog_matches_json(tmp_path: Path) -> None:
+    catalog = catalog_document()
+    binary_catalog_path = write_binary_catalog(catalog, Path.joinpath(tmp_path, "catalog.oscalb"))
+    lazy_catalog = LazyCatalog(catalog)
+
+    with BinaryCatalog(binary_catalog_path) as binary_catalog:
+        assert binary_catalog.to_dict() == catalog
+        for control_id in lazy_catalog.control_ids():
+            assert binary_catalog.control(control_id) == lazy_catalog.raw_controls()[control_id]
+
+
+def test_duplicate_ids_resolve_like_lazy_catalog(tmp_path: Path) -> None:
+    # A deeply nested control followed by a shallower one with the same ID. The node table
+    # is breadth-first, but lookups must still find the first one in the document.
+    catalog = catalog_document()
+    controls = list(raw_controls(catalog["catalog"]))
+    deep_position = max(range(len(controls)), key=lambda position: controls[position][1])
+    deep_control, deep_depth = controls[deep_position]
+    shallow_control = next(
+        raw_control
+        for raw_control, depth in controls[deep_position + 1:]
+        if depth < deep_depth
+    )
+    shallow_control["id"] = deep_control["id"]
+
+    binary_catalog_path = write_binary_catalog(catalog, Path.joinpath(tmp_path, "catalog.oscalb"))
+    with BinaryCatalog(binary_catalog_path) as binary_catalog:
+        assert binary_catalog.control(deep_control["id"]) == deep_control
+    assert LazyCatalog(catalog).control(deep_control["id"]).title == deep_control["title"]
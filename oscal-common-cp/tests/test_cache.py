@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from oscal_common_cp.batch import ConversionOptions, convert_file
+from oscal_common_cp.cache import ConversionCache
+
+
+def test_cache_hit_writes_the_same_bytes(tmp_path: Path, policy_lines: list[str]) -> None:
+    policy_path = Path.joinpath(tmp_path, "policy.md")
+    policy_path.write_text("\n".join(policy_lines))
+    cache = ConversionCache(Path.joinpath(tmp_path, "cache"))
+    options = ConversionOptions()
+
+    converted = convert_file(policy_path, Path.joinpath(tmp_path, "first"), options, cache)
+    cached = convert_file(policy_path, Path.joinpath(tmp_path, "second"), options, cache)
+
+    assert converted.succeeded and not converted.cached
+    assert cached.succeeded and cached.cached
+    assert cached.output_path.name == converted.output_path.name
+    assert cached.output_path.read_bytes() == converted.output_path.read_bytes()
+
+
+def test_cache_misses_on_changes(tmp_path: Path, policy_lines: list[str]) -> None:
+    policy_path = Path.joinpath(tmp_path, "policy.md")
+    policy_path.write_text("\n".join(policy_lines))
+    cache = ConversionCache(Path.joinpath(tmp_path, "cache"))
+    output_dir = Path.joinpath(tmp_path, "oscal-json")
+
+    convert_file(policy_path, output_dir, ConversionOptions(), cache)
+    # An option that changes the output
+    assert not convert_file(policy_path, output_dir, ConversionOptions(pretty=False), cache).cached
+    # A change to the policy
+    policy_path.write_text("\n".join(policy_lines) + "\nOne more line.")
+    assert not convert_file(policy_path, output_dir, ConversionOptions(), cache).cached
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from oscal_common_cp import catalog_writer
+from oscal_common_cp.catalog_writer import serialize_catalog
+from oscal_common_cp.simple_oscal_parser import SimpleOscalParser
+
+
+@pytest.mark.parametrize("pretty", [True, False], ids=["pretty", "compact"])
+def test_auto_writes_pydantic_output(policy_lines: list[str], pretty: bool) -> None:
+    # The default output mustn't depend on whether orjson happens to be installed
+    common_catalog = SimpleOscalParser().common_policy_to_catalog(
+        policy_lines, deterministic_uuids=True
+    )
+    assert serialize_catalog(common_catalog, "auto", pretty) == serialize_catalog(
+        common_catalog, "pydantic", pretty
+    )
+
+
+@pytest.mark.skipif(catalog_writer.orjson is None, reason="orjson is not installed")
+def test_serializers_write_the_same_document(policy_lines: list[str]) -> None:
+    common_catalog = SimpleOscalParser().common_policy_to_catalog(
+        policy_lines, deterministic_uuids=True
+    )
+    pydantic_json = serialize_catalog(common_catalog, "pydantic")
+    orjson_json = serialize_catalog(common_catalog, "orjson")
+
+    # Only the indentation differs when pretty, and nothing at all when compact
+    assert json.loads(orjson_json) == json.loads(pydantic_json)
+    assert serialize_catalog(common_catalog, "orjson", pretty=False) == serialize_catalog(
+        common_catalog, "pydantic", pretty=False
+    )
@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import io
+
+import pytest
+
+from oscal_common_cp.batch import ConversionOptions, convert_file
+from oscal_common_cp.catalog_writer import serialize_catalog
+from oscal_common_cp.context import ConversionContext
+from oscal_common_cp.simple_oscal_parser import SimpleOscalParser, validate_catalog
+from oscal_common_cp.synthetic_policy import SyntheticPolicy
+
+
+def test_locate_html_tables() -> None:
+    contents = [
+        "# Section",
+        "<table>",
+        "<tr><td>a</td></tr>",
+        "</table>",
+        "text",
+        "<table><tr><td>b</td></tr></table>",
+        "</table>",
+    ]
+    assert SimpleOscalParser().locate_html_tables(contents) == [(1, 3), (5, 5)]
+
+
+def test_one_line_references_table() -> None:
+    references = [
+        "# Appendix B: References",
+        "",
+        "<table><tr><td>APL</td><td>Approved Products List (APL) "
+        "https://www.idmanagement.gov/buy/</td></tr></table>",
+    ]
+    back_matter = SimpleOscalParser().parse_backmatter(references, ConversionContext())
+
+    assert len(back_matter.resources) == 1
+    assert back_matter.resources[0].title == "APL"
+    assert str(back_matter.resources[0].rlinks[0].href) == "https://www.idmanagement.gov/buy/"
+
+
+@pytest.mark.parametrize(
+    "section_contents",
+    [
+        ["## 1.1 Overview", "text", "</table>"],
+        ["## 1.1 Overview", "<table>", "<tr><td>a</td></tr>", "</table>", "</table>"],
+    ],
+    ids=["no table", "closed twice"],
+)
+def test_unmatched_table_end(section_contents: list[str]) -> None:
+    with pytest.raises(ValueError, match="in section '1.1 Overview'"):
+        SimpleOscalParser().scan_section_blocks(section_contents, ConversionContext())
+
+
+def test_split_sections_matches_splitlines() -> None:
+    # The CLI reads policies a line at a time, the daemon and HTTP service get the whole
+    # text. Both must see the same lines.
+    policy_text = "Intro\r\n\n# One\ftext\x0bmore\u2028# Two\u2029last\x85\x1c\n# Three\nend"
+    from_file = list(SimpleOscalParser().split_sections(io.StringIO(policy_text, newline=None)))
+    from_text = list(SimpleOscalParser().split_sections(policy_text.splitlines()))
+
+    assert from_file == from_text
+    assert from_text == [["Intro"], ["# One", "text", "more"], ["# Two", "last"]]
+
+
+def test_trusted_groups_stay_out_of_the_memo() -> None:
+    policy_lines = list(SyntheticPolicy(sections=30).lines())
+    parser = SimpleOscalParser()
+
+    parser.common_policy_to_catalog(policy_lines, trusted=True)
+    assert len(parser.section_memo.control_groups) == 0
+
+    parser.common_policy_to_catalog(policy_lines)
+    parser.common_policy_to_catalog(policy_lines, trusted=True)
+    assert parser.section_memo.hits == len(parser.section_memo.control_groups) > 0
+
+
+def test_reused_parser_starts_over(policy_lines: list[str]) -> None:
+    # Nothing from one conversion, such as the position in the TOC, carries over to the next
+    parser = SimpleOscalParser()
+    first_catalog = parser.common_policy_to_catalog(policy_lines, deterministic_uuids=True)
+    second_catalog = parser.common_policy_to_catalog(policy_lines, deterministic_uuids=True)
+
+    assert second_catalog.catalog.groups[0].title.startswith("1 ")
+    assert serialize_catalog(second_catalog) == serialize_catalog(first_catalog)
+
+
+def test_concurrent_conversions_agree(policy_lines: list[str]) -> None:
+    expected_json = serialize_catalog(
+        SimpleOscalParser().common_policy_to_catalog(policy_lines, deterministic_uuids=True)
+    )
+
+    shared_parser = SimpleOscalParser()
+
+    def convert(_: int) -> str:
+        return serialize_catalog(
+            shared_parser.common_policy_to_catalog(policy_lines, deterministic_uuids=True)
+        )
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        catalog_jsons = list(executor.map(convert, range(8)))
+    assert catalog_jsons == [expected_json] * 8
+
+
+def test_deterministic_uuids(tmp_path: Path, policy_lines: list[str]) -> None:
+    # Converting the same policy again, later and with another parser, writes the same bytes
+    policy_path = Path.joinpath(tmp_path, "policy.md")
+    policy_path.write_text("\n".join(policy_lines))
+    options = ConversionOptions(deterministic_uuids=True)
+
+    first_result = convert_file(policy_path, Path.joinpath(tmp_path, "first"), options)
+    second_catalog = SimpleOscalParser(memoize_sections=False).common_policy_to_catalog(
+        policy_lines, deterministic_uuids=True
+    )
+
+    assert first_result.output_path.read_text() == serialize_catalog(second_catalog)
+
+
+def test_random_uuids(policy_lines: list[str]) -> None:
+    parser = SimpleOscalParser()
+    first_catalog = parser.common_policy_to_catalog(policy_lines)
+    second_catalog = parser.common_policy_to_catalog(policy_lines)
+
+    assert first_catalog.catalog.uuid != second_catalog.catalog.uuid
+
+
+def test_trusted_matches_validated(policy_lines: list[str]) -> None:
+    parser = SimpleOscalParser(memoize_sections=False)
+    validated_catalog = parser.common_policy_to_catalog(policy_lines, deterministic_uuids=True)
+    trusted_catalog = parser.common_policy_to_catalog(
+        policy_lines, deterministic_uuids=True, trusted=True
+    )
+
+    assert serialize_catalog(trusted_catalog) == serialize_catalog(validated_catalog)
+    # What was built without validation passes it
+    validate_catalog(trusted_catalog)
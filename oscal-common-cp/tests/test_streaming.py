@@ -0,0 +1,48 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from oscal_common_cp import catalog_writer
+from oscal_common_cp.batch import ConversionOptions, convert_file
+from oscal_common_cp.catalog_writer import serialize_catalog, stream_catalog_json
+from oscal_common_cp.simple_oscal_parser import SimpleOscalParser
+
+SERIALIZERS = [
+    "pydantic",
+    pytest.param(
+        "orjson",
+        marks=pytest.mark.skipif(catalog_writer.orjson is None, reason="orjson is not installed"),
+    ),
+]
+
+
+@pytest.mark.parametrize("pretty", [True, False], ids=["pretty", "compact"])
+@pytest.mark.parametrize("serializer", SERIALIZERS)
+def test_stream_matches_serialize(policy_lines: list[str], serializer: str, pretty: bool) -> None:
+    # UUIDs are derived from the content, so both conversions give the same catalog
+    parser = SimpleOscalParser(memoize_sections=False)
+    common_catalog = parser.common_policy_to_catalog(policy_lines, deterministic_uuids=True)
+    catalog_stream = parser.stream_catalog(policy_lines, deterministic_uuids=True)
+
+    catalog_file = io.StringIO()
+    stream_catalog_json(catalog_stream, catalog_file, serializer, pretty)
+
+    assert catalog_file.getvalue() == serialize_catalog(common_catalog, serializer, pretty)
+
+
+def test_streamed_file_matches(tmp_path: Path, policy_lines: list[str]) -> None:
+    policy_path = Path.joinpath(tmp_path, "policy.md")
+    policy_path.write_text("\n".join(policy_lines))
+
+    catalog_files = []
+    for streaming in (False, True):
+        result = convert_file(
+            policy_path,
+            Path.joinpath(tmp_path, f"streaming={streaming}"),
+            ConversionOptions(deterministic_uuids=True, streaming=streaming),
+        )
+        assert result.succeeded, result.error
+        catalog_files.append(result.output_path.read_bytes())
+
+    assert catalog_files[0] == catalog_files[1]
@@ -0,0 +1,117 @@
+import pytest
+
+from oscal_common_cp.table_parser import TableParser
+
+# Tables in the shapes pandoc writes them in the tokenized policies. Table lines are joined
+# without separators before parsing, as parse_html_table does.
+CORPUS_TABLES = {
+    "revision history": "".join([
+        "<table>",
+        "<colgroup>",
+        '<col style="width: 18%" />',
+        '<col style="width: 22%" />',
+        '<col style="width: 59%" />',
+        "</colgroup>",
+        "<thead>",
+        '<tr class="header">',
+        "<th>Version</th>",
+        "<th>Date</th>",
+        "<th>Details</th>",
+        "</tr>",
+        "</thead>",
+        "<tbody>",
+        '<tr class="odd">',
+        "<td>1.0</td>",
+        "<td>May 7, 2007</td>",
+        "<td>Revised Common Policy (<strong>RFC</strong> 3647 format)</td>",
+        "</tr>",
+        '<tr class="even">',
+        "<td>2.6</td>",
+        "<td>December 15, 2023</td>",
+        "<td>Updated <em>id-fpki-common-devices</em> &amp; related OIDs</td>",
+        "</tr>",
+        "</tbody>",
+        "</table>",
+    ]),
+    "plain rows": "".join([
+        "<table>",
+        "<tbody>",
+        "<tr>",
+        "<td>Version</td>",
+        "<td>Date</td>",
+        "<td>Details</td>",
+        "</tr>",
+        "<tr>",
+        "<td>1.0</td>",
+        "<td>May 7, 2007</td>",
+        "<td>Initial version</td>",
+        "</tr>",
+        "</table>",
+    ]),
+    "rows on one line": (
+        "<table><tr><td>one</td><td>two</td></tr>"
+        "<tr><td>three</td><td>four &lt; 5</td></tr></table>"
+    ),
+    "references": "".join([
+        "<table>",
+        "<tr><td>ABADSG</td><td>Digital Signature Guidelines, 1996-08-01. "
+        "http://example.com/aba</td></tr>",
+        "<tr><td>NOURL</td><td>No url here</td></tr>",
+        '<tr><td>APL</td><td>Approved Products List (APL) <a href="https://www.idmanagement.gov/buy/">'
+        "https://www.idmanagement.gov/buy/</a></td></tr>",
+        "</table>",
+    ]),
+    "paragraphs and breaks in cells": "".join([
+        "<table>",
+        '<tr class="odd">',
+        "<td><p>Certificates issued to CAs</p><p>and to end entities</p></td>",
+        "<td>Line one<br />Line two<br/>Line three</td>",
+        "<td>The CA&#8217;s key &ndash; &#x2014; &nbsp;rollover</td>",
+        "</tr>",
+        "</table>",
+    ]),
+    "uppercase tags and attributes": "".join([
+        '<TABLE BORDER="1">',
+        "<TR><TD ALIGN=left>Upper</TD><TD class='c'>case</TD></TR>",
+        "</TABLE>",
+    ]),
+}
+
+
+def feed_table(table_html: str) -> list[list[str]]:
+    # What the table parses to through HTMLParser's own tokenizer
+    table_parser = TableParser()
+    table_parser.feed(table_html)
+    table_parser.close()
+    return table_parser.parsed_table
+
+
+@pytest.mark.parametrize("table_html", CORPUS_TABLES.values(), ids=CORPUS_TABLES.keys())
+def test_fast_path_matches_html_parser(table_html: str) -> None:
+    table_parser = TableParser()
+    table_parser.reset()
+    # The corpus shapes must all stay on the fast path
+    assert table_parser.parse_simple_table(table_html)
+    assert table_parser.parsed_table == feed_table(table_html)
+
+
+@pytest.mark.parametrize(
+    "table_html",
+    [
+        "<table><!-- generated --><tr><td>a</td><td>b</td></tr></table>",
+        "<table><tr><td>a < b</td></tr></table>",
+        "<table><tr><td><script>var x = '<td>';</script>c</td></tr></table>",
+    ],
+    ids=["comment", "stray <", "script"],
+)
+def test_fallback_matches_html_parser(table_html: str) -> None:
+    table_parser = TableParser()
+    table_parser.reset()
+    assert not table_parser.parse_simple_table(table_html)
+    assert table_parser.parse(table_html) == feed_table(table_html)
+
+
+def test_parser_is_reusable() -> None:
+    table_parser = TableParser()
+    for table_html in CORPUS_TABLES.values():
+        assert table_parser.parse(table_html) == feed_table(table_html)